@@ -0,0 +1,46 @@
+import glob
+import os
+import sys
+
+import pygame
+
+from convert_maps import convert
+from src.pack import PackWriter, is_stale
+from src.utils import BASE_IMG_PATH, BINARY_MAP_EXT, STREAMING_MAP_EXT, PACK_PATH, pack_sources
+
+
+def build(path=PACK_PATH, force=False):
+    # Returns None when no source changed since the pack was built. Staleness is only
+    # checked here; the game opens the pack as it is. Maps are converted from their
+    # JSON here, so the pack never holds stale ones.
+    if not force and os.path.exists(path) and not is_stale(path, pack_sources()):
+        return None
+    for map_file in sorted(glob.glob('data/maps/*.json')):
+        convert(map_file)
+    for map_file in sorted(glob.glob('data/maps/*' + STREAMING_MAP_EXT)):
+        convert(os.path.splitext(map_file)[0] + '.json', STREAMING_MAP_EXT)
+    writer = PackWriter()
+    for root, dirs, files in os.walk(BASE_IMG_PATH):
+        for file_name in sorted(files):
+            image_path = os.path.join(root, file_name).replace(os.sep, '/')
+            writer.add_image(image_path, pygame.image.load(image_path))
+    for map_file in sorted(glob.glob('data/maps/*' + BINARY_MAP_EXT) + glob.glob('data/maps/*' + STREAMING_MAP_EXT)):
+        with open(map_file, 'rb') as f:
+            writer.add_file(map_file.replace(os.sep, '/'), f.read())
+    writer.write(path)
+    return writer
+
+
+if __name__ == "__main__":
+    # --force rebuilds even when the pack is newer than every source
+    args = sys.argv[1:]
+    force = '--force' in args
+    if force:
+        args.remove('--force')
+    pack_path = args[0] if args else PACK_PATH
+    writer = build(pack_path, force)
+    if writer is None:
+        print(f"{pack_path} is up to date")
+        sys.exit()
+    print(f"{pack_path}: {len(writer.entries)} entries, {len(writer.blobs)} unique blobs, "
+          f"{os.path.getsize(pack_path)} bytes")
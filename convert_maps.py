@@ -0,0 +1,25 @@
+import glob
+import os
+import sys
+
+from src.map_format import read_map, write_map
+from src.utils import BINARY_MAP_EXT, STREAMING_MAP_EXT
+
+
+def convert(path, ext=BINARY_MAP_EXT):
+    binary_path = os.path.splitext(path)[0] + ext
+    write_map(binary_path, read_map(path))
+    return binary_path
+
+
+if __name__ == "__main__":
+    # --stream writes chunked streaming maps, for levels too large to keep in memory
+    args = sys.argv[1:]
+    ext = BINARY_MAP_EXT
+    if '--stream' in args:
+        args.remove('--stream')
+        ext = STREAMING_MAP_EXT
+    paths = args or sorted(glob.glob('data/maps/*.json'))
+    for path in paths:
+        binary_path = convert(path, ext)
+        print(f"{path} ({os.path.getsize(path)} bytes) -> {binary_path} ({os.path.getsize(binary_path)} bytes)")
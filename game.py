@@ -1,18 +1,23 @@
 import sys
 import pygame
 import random
-import math
-import os
+import glob
 
 from src.utils import (resize_image, load_image, load_images, SCREEN_WIDTH, SCREEN_HEIGHT,
                        DISPLAY_WIDTH, DISPLAY_HEIGHT, PLAYER_SIZE_X, PLAYER_SIZE_Y, TILE_SIZE, Animation, JSON_MAP_WIDTH_STR, JSON_MAP_HEIGHT_STR,
                        JSON_LARGE_DECOR_STR, JSON_POS_STR, JSON_SPAWNER_STR,
-                       PROJECTILE_STR, LEAF_STR, FPS, TYPE_ENEMY_STR, TYPE_PLAYER_STR
+                       PROJECTILE_STR, LEAF_STR, LEAF_SWAY, PARTICLE_STR, FPS, TYPE_ENEMY_STR, TYPE_PLAYER_STR
                        )
+from src.broadphase import Broadphase
 from src.clouds import Clouds
+from src.explosion import ExplosionSprites
 from src.entities import Player, Enemy, FloatingEnemy
+from src.entity_list import EntityList
 from src.tilemap import Tilemap
-from src.particle import Particle
+from src.particle import ParticleSystem
+from src.pool import Pool
+from src.projectile import Projectile
+from src.spark import SparkSystem
 from src.rain import Rain
 
 
@@ -57,6 +62,16 @@ class Game:
         self.background = resize_image(self.background)
         self.clouds = Clouds(self.assets['clouds'], count=4)
         self.rains = Rain(30)
+        self.broadphase = Broadphase()
+        self.projectile_pool = Pool(Projectile)
+        self.projectiles = EntityList()
+        self.throwables = EntityList()
+        self.explosions = EntityList()
+        self.sparks = SparkSystem()
+        self.explosion_sprites = ExplosionSprites()
+        self.particles = ParticleSystem()
+        self.particles.register(LEAF_STR, self.assets['particle/' + LEAF_STR], sway=LEAF_SWAY)
+        self.particles.register(PARTICLE_STR, self.assets['particle/' + PARTICLE_STR])
 
         self.player = Player(self,
                              (-14,
@@ -90,11 +105,10 @@ class Game:
             self.enemies.append(FloatingEnemy(
                 self, spawner[JSON_POS_STR], (PLAYER_SIZE_X, PLAYER_SIZE_Y)))
 
-        self.projectiles = []
-        self.throwables = []
-        self.particles = []
-        self.sparks = []
-        self.explosions = []
+        for projectile in self.projectiles:
+            self.projectile_pool.release(projectile)
+        for effects in (self.projectiles, self.throwables, self.particles, self.sparks, self.explosions):
+            effects.clear()
 
         self.scroll = [0, 0]
         self.dead = 0
@@ -122,7 +136,7 @@ class Game:
                 self.transition += 1
                 if self.transition > 30:
                     self.level = min(
-                        self.level + 1, len(os.listdir('data/maps')) - 1)
+                        self.level + 1, len(glob.glob('data/maps/*.json')) - 1)
                     self.load_lvl(self.level)
             if self.transition < 0:
                 self.transition += 1
@@ -154,8 +168,8 @@ class Game:
                 if random.random() * 30000 < rect.width * rect.height:
                     pos = (rect.x + random.random() * rect.width,
                            rect.y + random.random() * rect.height)
-                    self.particles.append(Particle(self, LEAF_STR, pos, velocity=[
-                                          random.random(), random.random()], frame=random.randint(0, 20)))
+                    self.particles.spawn(LEAF_STR, pos, velocity=[
+                                         random.random(), random.random()], frame=random.randint(0, 20))
 
             self.clouds.update()
             self.clouds.render(self.main_surface, offset=render_scroll)
@@ -170,45 +184,47 @@ class Game:
                 enemy.render(self.main_surface, offset=render_scroll)
                 if kill:
                     self.enemies.remove(enemy)
+            self.broadphase.rebuild(self.player, self.enemies)
+            if abs(self.player.dashing) >= 50:
+                for enemy in self.broadphase.enemies_in_rect(self.player.rect()):
+                    if enemy.dash_hit():
+                        self.enemies.remove(enemy)
+                        self.broadphase.remove(enemy)
 
             if not self.dead:
                 self.player.update(self, self.tilemap,
                                    (self.movement[1] - self.movement[0], 0))
+                self.broadphase.move(self.player, self.player.rect())
                 self.player.render(self.main_surface, offset=render_scroll)
 
-            for projectile in self.projectiles.copy():
+            for projectile in self.projectiles:
                 kill = projectile.update(self.tilemap)
                 projectile.render(self.main_surface, offset=render_scroll)
                 if kill == 0:
-                    self.projectiles.remove(projectile)
+                    self.projectiles.kill(projectile)
+                    self.projectile_pool.release(projectile)
+            self.projectiles.compact()
 
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                spark.render(self.main_surface, offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
+            self.sparks.update()
+            self.sparks.render(self.main_surface, offset=render_scroll)
 
-            for throwable in self.throwables.copy():
+            for throwable in self.throwables:
                 kill = throwable.update(self.tilemap)
                 throwable.render(self.main_surface, offset=render_scroll)
                 if kill:
-                    self.throwables.remove(throwable)
+                    self.throwables.kill(throwable)
+            self.throwables.compact()
 
-            for explosion in self.explosions.copy():
+            for explosion in self.explosions:
                 dt = self.clock.get_time() / 1000
                 kill = explosion.update(dt)
                 explosion.render(self.main_surface, offset=render_scroll)
                 if kill:
-                    self.explosions.remove(explosion)
-
-            for particle in self.particles.copy():
-                kill = particle.update()
-                particle.render(self.main_surface, offset=render_scroll)
-                if particle.type == LEAF_STR:
-                    particle.pos[0] += math.sin(
-                        particle.animation.frame * 0.035) * 0.3
-                if kill:
-                    self.particles.remove(particle)
+                    self.explosions.kill(explosion)
+            self.explosions.compact()
+
+            self.particles.update()
+            self.particles.render(self.main_surface, offset=render_scroll)
 
             # Update character position during initialization
             if self.initializing:
@@ -1,17 +1,33 @@
 import sys
+import heapq
 import pygame
 import random
 import math
 import os
 from src.utils import (resize_image, load_image, load_images, SCREEN_WIDTH, SCREEN_HEIGHT,
                        DISPLAY_WIDTH, DISPLAY_HEIGHT, PLAYER_SIZE_X, PLAYER_SIZE_Y, TILE_SIZE, Animation, JSON_MAP_WIDTH_STR, JSON_MAP_HEIGHT_STR,
-                       JSON_LARGE_DECOR_STR, JSON_POS_STR, JSON_SPAWNER_STR,
-                       LEAF_STR, FPS)
+                       JSON_POS_STR,
+                       LEAF_STR, LEAF_MARGIN, LEAF_SWAY, PARTICLE_STR, FPS, PACK_PATH, USE_PACK, BATCHED_PHYSICS)
+from src.ai_scheduler import AIScheduler
+from src.broadphase import Broadphase
 from src.clouds import Clouds
-from src.entities import Player, FloatingEnemy
-from src.tilemap import Tilemap
-from src.particle import Particle
+from src.entities import Player
+from src.entity_list import EntityList
+from src.explosion import ExplosionSprites
+from src.pack import Pack
+from src.level_registry import LevelRegistry, LevelCache, LevelPrefetcher
+from src.line_of_sight import LineOfSight
+from src.navigation import Navigation
+from src.particle import ParticleSystem
+from src.pool import Pool
+from src.projectile import Projectile
+from src.spark import SparkSystem
+from src.physics_world import PhysicsWorld
 from src.rain import Rain
+from src.spawn_zones import SpawnZones
+from src.triggers import Trigger, Triggers
+from src.render_queue import (RenderQueue, LAYER_ENEMIES, LAYER_PLAYER, LAYER_PROJECTILES,
+                              LAYER_SPARKS, LAYER_THROWABLES, LAYER_EXPLOSIONS, LAYER_PARTICLES)
 
 
 class Game:
@@ -27,56 +43,86 @@ class Game:
         self.initializing = True
         self.next_lvl_transition = False
 
+        self.pack = Pack(PACK_PATH) if USE_PACK and os.path.exists(PACK_PATH) else None
         self.assets = self.load_assets()
         self.background = resize_image(self.assets['background'])
         self.clouds = Clouds(self.assets['clouds'], count=4)
         self.rains = Rain(30)
         self.player = Player(self, (-14, 150 - 16),
                              (PLAYER_SIZE_X, PLAYER_SIZE_Y))
-        self.tilemap = Tilemap(self, tile_size=TILE_SIZE)
+        self.level_registry = LevelRegistry(self.pack)
+        self.level_cache = LevelCache(self)
+        self.level_prefetcher = LevelPrefetcher(self, self.level_cache)
+        self.render_queue = RenderQueue()
+        self.physics_world = PhysicsWorld() if BATCHED_PHYSICS else None
+        self.ai_scheduler = AIScheduler()
+        self.line_of_sight = LineOfSight()
+        self.navigation = Navigation()
+        self.broadphase = Broadphase()
+        self.projectile_pool = Pool(Projectile)
+        self.projectiles = EntityList()
+        self.throwables = EntityList()
+        self.particles = ParticleSystem()
+        self.particles.register(LEAF_STR, self.assets['particle/' + LEAF_STR], sway=LEAF_SWAY)
+        self.particles.register(PARTICLE_STR, self.assets['particle/' + PARTICLE_STR])
+        self.sparks = SparkSystem()
+        self.explosion_sprites = ExplosionSprites()
+        self.explosions = EntityList()
+        self.render_stats = self.render_queue.stats()
 
         self.level = 0
         self.direction = 'l'
         self.load_level(self.level, self.direction)
 
     def load_assets(self):
+        pack = self.pack
         return {
-            'decor': load_images('tiles/decor'),
-            'grass': load_images('tiles/grass'),
-            'large_decor': load_images('tiles/large_decor'),
-            'stone': load_images('tiles/stone'),
-            'player': load_image('entities/player.png'),
-            'background': load_image('bg1.jpg'),
-            'clouds': load_images('clouds'),
-            'dungeon': load_images('tiles/dungeon'),
-            'enemy/idle': Animation(load_images('entities/enemy/idle'), img_dur=10),
-            'enemy/walk': Animation(load_images('entities/enemy/walk'), img_dur=10),
-            'floatingEnemy/idle': Animation(load_images('entities/floatingEnemy/idle'), img_dur=10),
-            'floatingEnemy/walk': Animation(load_images('entities/floatingEnemy/walk'), img_dur=10),
-            'player/idle': Animation(load_images('entities/player/idle'), img_dur=10),
-            'player/walk': Animation(load_images('entities/player/walk'), img_dur=10),
-            'player/jump': Animation(load_images('entities/player/jump')),
-            'player/slide': Animation(load_images('entities/player/slide')),
-            'player/wall_slide': Animation(load_images('entities/player/wall_slide')),
-            'particle/leaf': Animation(load_images('particles/leaf'), img_dur=20, loop=False),
-            'particle/particle': Animation(load_images('particles/particle'), img_dur=6, loop=False),
-            'throwable/grenade': Animation(load_images('throwable/grenade'), img_dur=10),
-            'gun': load_image('gun.png'),
-            'projectile': load_image('projectile.png'),
+            'decor': load_images('tiles/decor', pack),
+            'grass': load_images('tiles/grass', pack),
+            'large_decor': load_images('tiles/large_decor', pack),
+            'stone': load_images('tiles/stone', pack),
+            'player': load_image('entities/player.png', pack),
+            'background': load_image('bg1.jpg', pack),
+            'clouds': load_images('clouds', pack),
+            'dungeon': load_images('tiles/dungeon', pack),
+            'enemy/idle': Animation(load_images('entities/enemy/idle', pack), img_dur=10),
+            'enemy/walk': Animation(load_images('entities/enemy/walk', pack), img_dur=10),
+            'floatingEnemy/idle': Animation(load_images('entities/floatingEnemy/idle', pack), img_dur=10),
+            'floatingEnemy/walk': Animation(load_images('entities/floatingEnemy/walk', pack), img_dur=10),
+            'player/idle': Animation(load_images('entities/player/idle', pack), img_dur=10),
+            'player/walk': Animation(load_images('entities/player/walk', pack), img_dur=10),
+            'player/jump': Animation(load_images('entities/player/jump', pack)),
+            'player/slide': Animation(load_images('entities/player/slide', pack)),
+            'player/wall_slide': Animation(load_images('entities/player/wall_slide', pack)),
+            'particle/leaf': Animation(load_images('particles/leaf', pack), img_dur=20, loop=False),
+            'particle/particle': Animation(load_images('particles/particle', pack), img_dur=6, loop=False),
+            'throwable/grenade': Animation(load_images('throwable/grenade', pack), img_dur=10),
+            'gun': load_image('gun.png', pack),
+            'projectile': load_image('projectile.png', pack),
         }
 
     def load_level(self, level, direction):
-        self.tilemap.load('data/maps/' + str(level) + '.json')
-        self.leaf_spawners = [pygame.Rect(4 + tree[JSON_POS_STR][0], 4 + tree[JSON_POS_STR][1], 23, 13)
-                              for tree in self.tilemap.extract([(JSON_LARGE_DECOR_STR, 2)], keep=True)]
-        self.enemies = [FloatingEnemy(self, spawner[JSON_POS_STR], (PLAYER_SIZE_X, PLAYER_SIZE_Y))
-                        for spawner in self.tilemap.extract([(JSON_SPAWNER_STR, 1)])]
-
-        self.projectiles = []
-        self.throwables = []
-        self.particles = []
-        self.sparks = []
-        self.explosions = []
+        level_data = self.level_prefetcher.take(level)
+        self.tilemap = level_data.tilemap
+        # Doors are matched against the player, leaf spawners against the view
+        self.triggers = Triggers()
+        self.door = None
+        for door in (self.tilemap.lvl['next_lvl'] if self.tilemap.lvl else []):
+            self.triggers.add(Trigger(self.tilemap.rect(door['pos'], door['dir']),
+                                      self.enter_door, self.exit_door, door))
+        self.view_triggers = Triggers()
+        self.leaf_queue = []
+        self.leaf_frame = 0
+        for tree in level_data.trees:
+            self.view_triggers.add(Trigger((4 + tree[JSON_POS_STR][0], 4 + tree[JSON_POS_STR][1], 23, 13),
+                                           self.schedule_leaf, self.unschedule_leaf))
+        # Enemies are created by their spawn zones once the camera comes near
+        self.enemies = []
+        self.spawn_zones = SpawnZones(self, level_data.spawners)
+        # Build the rooms behind this room's doors while it is being played
+        self.level_prefetcher.prefetch(self.level_registry.neighbours[level])
+
+        self.clear_effects()
 
         self.scroll = [0, 0]
         self.dead = 0
@@ -120,16 +166,23 @@ class Game:
     def update_screen_shake(self):
         self.screen_shake = max(0, self.screen_shake - 1)
 
+    def enter_door(self, trigger, entity):
+        self.door = trigger.data
+
+    def exit_door(self, trigger, entity):
+        if self.door is trigger.data:
+            self.door = None
+
     def handle_level_transition(self):
-        next_lvl = self.tilemap.collide_nxt_lvl(self.player.rect())
-        if next_lvl is not None and not self.initializing:
+        self.triggers.update(self.player, self.player.rect())
+        if self.door is not None and not self.initializing:
             self.next_lvl_transition = True
-            self.direction = next_lvl['next_dir']
+            self.direction = self.door['next_dir']
+            self.next_level = self.level_registry.door_target(self.door, self.level)
         if self.next_lvl_transition and not self.initializing:
             self.transition += 1
             if self.transition > 30:
-                self.level = min(
-                    self.level + 1, len(os.listdir('data/maps')) - 1)
+                self.level = self.next_level
                 self.load_level(self.level, self.direction)
         if self.transition < 0:
             self.transition += 1
@@ -139,6 +192,9 @@ class Game:
             self.handle_death()
 
         render_scroll = self.handle_camera()
+        self.render_queue.begin(pygame.Rect(render_scroll, self.main_surface.get_size()))
+        self.tilemap.stream(self.render_queue.camera)
+        self.spawn_zones.update(self.render_queue.camera)
 
         self.update_leaf_spawners(render_scroll)
         self.tilemap.render(self.main_surface, offset=render_scroll)
@@ -147,7 +203,8 @@ class Game:
         if not self.dead:
             self.player.update(self, self.tilemap,
                                (self.movement[1] - self.movement[0], 0))
-            self.player.render(self.main_surface, offset=render_scroll)
+            self.broadphase.move(self.player, self.player.rect())
+            self.player.render(self.render_queue.layer(LAYER_PLAYER), offset=render_scroll)
 
         self.update_and_render_projectiles(render_scroll)
         self.update_and_render_sparks(render_scroll)
@@ -155,6 +212,9 @@ class Game:
         self.update_and_render_explosions(render_scroll)
         self.update_and_render_particles(render_scroll)
 
+        self.render_queue.flush(self.main_surface)
+        self.render_stats = self.render_queue.stats()
+
     def handle_camera(self):
         if (self.player.rect().centerx + self.main_surface.get_width() / 2) <= (self.tilemap.map_dims[JSON_MAP_WIDTH_STR] + TILE_SIZE):
             self.scroll[0] += (self.player.rect().centerx -
@@ -174,61 +234,105 @@ class Game:
         if self.dead >= 10:
             self.transition = min(30, self.transition + 1)
         if self.dead > 60:
-            self.load_level(self.level)
+            # Restarts come from the cached template, without touching the disk
+            self.load_level(self.level, self.direction)
+
+    def schedule_leaf(self, trigger, viewer):
+        # A tree drops a leaf with chance area / 30000 each frame, so the wait for
+        # the next one is drawn from the matching geometric distribution instead
+        chance = trigger.rect.width * trigger.rect.height / 30000
+        wait = 1
+        if chance < 1:
+            wait += int(math.log(1 - random.random()) / math.log(1 - chance))
+        trigger.data = self.leaf_frame + wait
+        heapq.heappush(self.leaf_queue, (trigger.data, id(trigger), trigger))
+
+    def unschedule_leaf(self, trigger, viewer):
+        trigger.data = None
 
     def update_leaf_spawners(self, render_scroll):
-        for rect in self.leaf_spawners:
-            if random.random() * 30000 < rect.width * rect.height:
-                pos = (rect.x + random.random() * rect.width,
-                       rect.y + random.random() * rect.height)
-                self.particles.append(Particle(self, LEAF_STR, pos, velocity=[
-                                      random.random(), random.random()], frame=random.randint(0, 20)))
+        self.leaf_frame += 1
+        self.view_triggers.update(self.main_surface, self.render_queue.camera.inflate(LEAF_MARGIN * 2, LEAF_MARGIN * 2))
+        while self.leaf_queue and self.leaf_queue[0][0] <= self.leaf_frame:
+            due, trigger_id, trigger = heapq.heappop(self.leaf_queue)
+            if trigger.data != due:
+                # Left the view since it was scheduled
+                continue
+            rect = trigger.rect
+            pos = (rect.x + random.random() * rect.width,
+                   rect.y + random.random() * rect.height)
+            self.particles.spawn(LEAF_STR, pos, velocity=[
+                                 random.random(), random.random()], frame=random.randint(0, 20))
+            self.schedule_leaf(trigger, self.main_surface)
 
     def update_and_render_enemies(self, render_scroll):
-        for enemy in self.enemies.copy():
+        layer = self.render_queue.layer(LAYER_ENEMIES)
+        self.navigation.update(self.tilemap, self.render_queue.camera, self.player.rect())
+        for enemy in self.ai_scheduler.plan(self.enemies, self.player.rect(), self.render_queue.camera):
             kill = enemy.update(self, self.tilemap, (0, 0))
-            enemy.render(self.main_surface, offset=render_scroll)
             if kill:
                 self.enemies.remove(enemy)
+        if self.physics_world is not None:
+            self.physics_world.step(self, self.tilemap)
+        self.broadphase.rebuild(self.player, self.enemies)
+        if abs(self.player.dashing) >= 50:
+            for enemy in self.broadphase.enemies_in_rect(self.player.rect()):
+                if enemy.dash_hit():
+                    self.enemies.remove(enemy)
+                    self.broadphase.remove(enemy)
+        for enemy in self.enemies:
+            enemy.render(layer, offset=render_scroll)
+
+    def clear_effects(self):
+        for projectile in self.projectiles:
+            self.projectile_pool.release(projectile)
+        for effects in (self.projectiles, self.throwables, self.particles, self.sparks, self.explosions):
+            effects.clear()
+
+    def pool_stats(self):
+        return {'projectiles': self.projectile_pool.stats()}
 
     def update_and_render_projectiles(self, render_scroll):
-        for projectile in self.projectiles.copy():
+        layer = self.render_queue.layer(LAYER_PROJECTILES)
+        for projectile in self.projectiles:
             kill = projectile.update(self.tilemap)
-            projectile.render(self.main_surface, offset=render_scroll)
+            projectile.render(layer, offset=render_scroll)
             if kill == 0:
-                self.projectiles.remove(projectile)
+                self.projectiles.kill(projectile)
+                self.projectile_pool.release(projectile)
+        self.projectiles.compact()
 
     def update_and_render_sparks(self, render_scroll):
-        for spark in self.sparks.copy():
-            kill = spark.update()
-            spark.render(self.main_surface, offset=render_scroll)
-            if kill:
-                self.sparks.remove(spark)
+        layer = self.render_queue.layer(LAYER_SPARKS)
+        self.sparks.update()
+        self.sparks.render(layer, offset=render_scroll)
+        self.render_queue.culled += self.sparks.culled
 
     def update_and_render_throwables(self, render_scroll):
-        for throwable in self.throwables.copy():
+        layer = self.render_queue.layer(LAYER_THROWABLES)
+        for throwable in self.throwables:
             kill = throwable.update(self.tilemap)
-            throwable.render(self.main_surface, offset=render_scroll)
+            throwable.render(layer, offset=render_scroll)
             if kill:
-                self.throwables.remove(throwable)
+                self.throwables.kill(throwable)
+        self.throwables.compact()
 
     def update_and_render_explosions(self, render_scroll):
-        for explosion in self.explosions.copy():
+        layer = self.render_queue.layer(LAYER_EXPLOSIONS)
+        for explosion in self.explosions:
             dt = self.clock.get_time() / 1000
             kill = explosion.update(dt)
-            explosion.render(self.main_surface, offset=render_scroll)
+            explosion.render(layer, offset=render_scroll)
+            self.render_queue.culled += explosion.culled
             if kill:
-                self.explosions.remove(explosion)
+                self.explosions.kill(explosion)
+        self.explosions.compact()
 
     def update_and_render_particles(self, render_scroll):
-        for particle in self.particles.copy():
-            kill = particle.update()
-            particle.render(self.main_surface, offset=render_scroll)
-            if particle.type == LEAF_STR:
-                particle.pos[0] += math.sin(
-                    particle.animation.frame * 0.035) * 0.3
-            if kill:
-                self.particles.remove(particle)
+        layer = self.render_queue.layer(LAYER_PARTICLES)
+        self.particles.update()
+        self.particles.render(layer, offset=render_scroll)
+        self.render_queue.culled += self.particles.culled
 
     def handle_initialization(self):
         if self.initializing and not self.player.flip and self.direction in ('l'):
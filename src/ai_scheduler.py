@@ -0,0 +1,70 @@
+import pygame
+
+# Enemies within this many pixels of the player think every frame
+AI_NEAR_DISTANCE = 160
+# Enemies elsewhere within this margin of the view think every AI_VIEW_PERIOD frames
+AI_VIEW_MARGIN = 64
+AI_VIEW_PERIOD = 4
+# Most decisions made per frame by enemies away from the player; the rest wait a frame
+AI_THINK_BUDGET = 32
+
+
+class AIScheduler:
+    # Level of detail for enemy AI. Each frame an enemy is near (thinks every frame),
+    # in view (thinks every AI_VIEW_PERIOD frames, phases spread across frames) or
+    # dormant (not updated at all). A decision covers all frames since the last one.
+    def __init__(self, near=AI_NEAR_DISTANCE, margin=AI_VIEW_MARGIN, period=AI_VIEW_PERIOD,
+                 budget=AI_THINK_BUDGET):
+        self.near = near
+        self.margin = margin
+        self.period = period
+        self.budget = budget
+        self.frame = 0
+        self.next_phase = 0
+        self.states = {}
+        self.thinks = 0
+        self.dormant = 0
+
+    def plan(self, enemies, player_rect, camera_rect):
+        # Sets think_frames on every enemy and returns the ones to update this frame
+        self.frame += 1
+        view = camera_rect.inflate(self.margin * 2, self.margin * 2)
+        center = pygame.Vector2(player_rect.center)
+        states = {}
+        awake = []
+        far_due = []
+        self.thinks = 0
+        self.dormant = 0
+        for enemy in enemies:
+            state = self.states.get(id(enemy))
+            if state is None:
+                state = [self.next_phase, self.frame - 1]
+                self.next_phase += 1
+            states[id(enemy)] = state
+            rect = enemy.rect()
+            if center.distance_to(rect.center) <= self.near:
+                self.think(enemy, state)
+            elif view.colliderect(rect):
+                enemy.think_frames = 0
+                if (self.frame + state[0]) % self.period == 0 or self.frame - state[1] > self.period:
+                    far_due.append((state[1], enemy, state))
+            else:
+                # Dormant enemies are not updated, so the time away is not made up
+                state[1] = self.frame
+                self.dormant += 1
+                continue
+            awake.append(enemy)
+        # Longest waiting first, so deferred decisions are never starved
+        far_due.sort(key=lambda due: due[0])
+        for last, enemy, state in far_due[:self.budget]:
+            self.think(enemy, state)
+        self.states = states
+        return awake
+
+    def think(self, enemy, state):
+        enemy.think_frames = self.frame - state[1]
+        state[1] = self.frame
+        self.thinks += 1
+
+    def stats(self):
+        return {'thinks': self.thinks, 'dormant': self.dormant}
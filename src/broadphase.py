@@ -0,0 +1,54 @@
+import math
+
+import pygame
+
+from src.spatial_grid import SpatialGrid
+
+# Bucket size, in pixels, of the per-frame actor grid
+BROADPHASE_CELL_SIZE = 32
+
+
+class Broadphase:
+    # Uniform grid over the enemies and the player, rebuilt once per frame after the
+    # enemies have moved. Hit checks ask it for candidates instead of scanning every enemy.
+    def __init__(self, cell_size=BROADPHASE_CELL_SIZE):
+        self.grid = SpatialGrid(cell_size)
+        self.player = None
+        self.queries = 0
+
+    def rebuild(self, player, enemies):
+        self.grid.clear()
+        self.player = player
+        self.queries = 0
+        for enemy in enemies:
+            self.grid.insert(enemy, enemy.rect())
+        self.grid.insert(player, player.rect())
+
+    def move(self, item, rect):
+        if item in self.grid:
+            self.grid.move(item, rect)
+
+    def remove(self, item):
+        if item in self.grid:
+            self.grid.remove(item)
+
+    def enemies_in_rect(self, rect):
+        self.queries += 1
+        return [item for item in self.grid.query_rect(rect) if item is not self.player]
+
+    def enemies_in_radius(self, center, radius):
+        self.queries += 1
+        return [item for item in self.grid.query_radius(center, radius) if item is not self.player]
+
+    def player_in_rect(self, rect):
+        self.queries += 1
+        return self.player in self.grid and self.grid.rect(self.player).colliderect(rect)
+
+    def segment_rect(self, origin, delta):
+        # Rect around the segment origin -> origin + delta, padded a pixel for rounding
+        left = math.floor(min(origin[0], origin[0] + delta[0])) - 1
+        top = math.floor(min(origin[1], origin[1] + delta[1])) - 1
+        return pygame.Rect(left, top, math.ceil(abs(delta[0])) + 3, math.ceil(abs(delta[1])) + 3)
+
+    def stats(self):
+        return {'actors': len(self.grid), 'queries': self.queries}
@@ -0,0 +1,107 @@
+import math
+
+
+class Hit:
+    # t is the fraction of the motion covered before contact, normal points out of the cell
+    def __init__(self, t, normal, cell):
+        self.t = t
+        self.normal = normal
+        self.cell = cell
+
+
+def axis_times(start, end, delta, low, high):
+    # Entry and exit times of the interval [start, end) moving by delta against [low, high)
+    if delta > 0:
+        return (low - end) / delta, (high - start) / delta
+    if delta < 0:
+        return (high - start) / delta, (low - end) / delta
+    if end <= low or start >= high:
+        return math.inf, -math.inf
+    return -math.inf, math.inf
+
+
+def sweep_box(box, delta, rect):
+    # Time of impact of box (x, y, w, h) moving by delta against rect, or None.
+    # Touching counts as contact when moving into it; boxes that already overlap are ignored.
+    x_entry, x_exit = axis_times(box[0], box[0] + box[2], delta[0], rect[0], rect[0] + rect[2])
+    y_entry, y_exit = axis_times(box[1], box[1] + box[3], delta[1], rect[1], rect[1] + rect[3])
+    entry = max(x_entry, y_entry)
+    if entry < 0 or entry > 1 or entry >= min(x_exit, y_exit):
+        return None
+    if x_entry > y_entry:
+        return entry, (-1 if delta[0] > 0 else 1, 0)
+    return entry, (0, -1 if delta[1] > 0 else 1)
+
+
+def sweep_aabb(tilemap, box, delta):
+    # First solid cell hit by box (x, y, w, h) moving by delta, as a Hit, or None
+    size = tilemap.tile_size
+    min_x = min(box[0], box[0] + delta[0])
+    min_y = min(box[1], box[1] + delta[1])
+    max_x = max(box[0], box[0] + delta[0]) + box[2]
+    max_y = max(box[1], box[1] + delta[1]) + box[3]
+    best = None
+    # Cells whose face lies exactly at the end of the move are included, for t = 1 contacts
+    for cx in range(int(math.ceil(min_x / size)) - 1, int(max_x // size) + 1):
+        for cy in range(int(math.ceil(min_y / size)) - 1, int(max_y // size) + 1):
+            if not tilemap.solid_cell((cx, cy)):
+                continue
+            contact = sweep_box(box, delta, (cx * size, cy * size, size, size))
+            if contact is not None and (best is None or contact[0] < best.t):
+                best = Hit(contact[0], contact[1], (cx, cy))
+    return best
+
+
+def raycast(tilemap, origin, delta):
+    # Walks the grid cells along the segment origin -> origin + delta (grid DDA) and
+    # returns the first solid one as a Hit. A ray starting inside a solid cell hits at
+    # t = 0 with a (0, 0) normal.
+    size = tilemap.tile_size
+    cell = [int(origin[0] // size), int(origin[1] // size)]
+    if tilemap.solid_cell(tuple(cell)):
+        return Hit(0, (0, 0), tuple(cell))
+    step = [0, 0]
+    t_max = [math.inf, math.inf]
+    t_delta = [math.inf, math.inf]
+    for axis in (0, 1):
+        if delta[axis] > 0:
+            step[axis] = 1
+            t_max[axis] = ((cell[axis] + 1) * size - origin[axis]) / delta[axis]
+            t_delta[axis] = size / delta[axis]
+        elif delta[axis] < 0:
+            step[axis] = -1
+            t_max[axis] = (cell[axis] * size - origin[axis]) / delta[axis]
+            t_delta[axis] = -size / delta[axis]
+    while True:
+        axis = 0 if t_max[0] < t_max[1] else 1
+        t = t_max[axis]
+        if t > 1:
+            return None
+        cell[axis] += step[axis]
+        t_max[axis] += t_delta[axis]
+        if tilemap.solid_cell(tuple(cell)):
+            normal = (-step[0], 0) if axis == 0 else (0, -step[1])
+            return Hit(t, normal, tuple(cell))
+
+
+def ray_rect(origin, delta, rect):
+    # Time at which the segment origin -> origin + delta enters rect, or None.
+    # A segment starting inside the rect enters at t = 0.
+    t_entry = 0
+    t_exit = 1
+    for axis in (0, 1):
+        low = rect[axis]
+        high = rect[axis] + rect[axis + 2]
+        if delta[axis] == 0:
+            if not low <= origin[axis] < high:
+                return None
+            continue
+        t0 = (low - origin[axis]) / delta[axis]
+        t1 = (high - origin[axis]) / delta[axis]
+        if t0 > t1:
+            t0, t1 = t1, t0
+        t_entry = max(t_entry, t0)
+        t_exit = min(t_exit, t1)
+        if t_entry > t_exit:
+            return None
+    return t_entry
@@ -2,14 +2,20 @@ import pygame
 import math
 import random
 
-from src.spark import Spark
-from src.particle import Particle
+from src.collision import sweep_aabb
+from src.navigation import NAV_AIR, NAV_CHASE_DISTANCE, NAV_GROUND
 from src.utils import (JSON_MAP_WIDTH_STR, JSON_MAP_HEIGHT_STR, SIZE_16, GRENADE_STR, SIZE_8, GRENADE_TIMER,
                        TILE_SIZE, PARTICLE_STR, PROJECTILE_SPEED, TYPE_ENEMY_STR, TYPE_PLAYER_STR)
-from src.projectile import Projectile
 from src.throwable import Throwable, Grenade
 
 
+def chance_over(chance, frames):
+    # Chance that a per-frame roll of chance succeeds at least once in frames frames
+    if frames == 1:
+        return chance
+    return 1 - (1 - chance) ** frames
+
+
 class PhysicsEntity:
     def __init__(self, game, e_type, pos, size):
         self.game = game
@@ -26,11 +32,31 @@ class PhysicsEntity:
         self.set_action('idle')
 
         self.last_movement = [0, 0]
+        # Set to a PhysicsWorld to have it move this entity in its batch
+        self.world = None
+        # Set to a Navigation to have this entity chase the player when close
+        self.navigation = None
+        # Frames covered by the next AI decision, 0 to keep the last one (see AIScheduler)
+        self.think_frames = 1
+        self.intent = (0, 0)
 
     def rect(self):
         return pygame.Rect(self.pos[0], self.pos[1],
                            self.size[0], self.size[1])
 
+    def chase_step(self, kind):
+        # Next cell step towards the player on the navigation flow field, or None
+        if self.navigation is None:
+            return None
+        rect = self.rect()
+        if pygame.Vector2(rect.midbottom).distance_to(self.game.player.rect().midbottom) > NAV_CHASE_DISTANCE:
+            return None
+        return self.navigation.next_step(kind, (rect.centerx, rect.bottom - 1))
+
+    def dash_hit(self):
+        # Called when the dashing player runs into this entity, True to kill it
+        return False
+
     def set_action(self, action):
         if action != self.action:
             self.action = action
@@ -38,35 +64,13 @@ class PhysicsEntity:
                                               '/' + self.action].copy()
 
     def update(self, game, tilemap, movement=(0, 0)):
-        self.collisions = {'up': False, 'down': False,
-                           'right': False, 'left': False}
         frame_movement = (movement[0] + self.velocity[0],
                           movement[1] + self.velocity[1])
-
-        self.pos[0] += frame_movement[0] * 2
-        if not game.initializing or game.direction == 'u':
-            entity_rect = self.rect()
-            for rect in tilemap.nearby_tiles_rects(self.pos):
-                if entity_rect.colliderect(rect):
-                    if frame_movement[0] > 0:
-                        entity_rect.right = rect.left
-                        self.collisions['right'] = True
-                    if frame_movement[0] < 0:
-                        entity_rect.left = rect.right
-                        self.collisions['left'] = True
-                    self.pos[0] = entity_rect.x
-
-            self.pos[1] += frame_movement[1]
-            entity_rect = self.rect()
-            for rect in tilemap.nearby_tiles_rects(self.pos):
-                if entity_rect.colliderect(rect):
-                    if frame_movement[1] > 0:
-                        entity_rect.bottom = rect.top
-                        self.collisions['down'] = True
-                    if frame_movement[1] < 0:
-                        entity_rect.top = rect.bottom
-                        self.collisions['up'] = True
-                    self.pos[1] = entity_rect.y
+        if self.world is not None:
+            # Resolved with every other body when the world steps
+            self.world.submit(self, frame_movement)
+        else:
+            self.move(game, tilemap, frame_movement)
 
         if movement[0] > 0:
             self.flip = False
@@ -75,13 +79,46 @@ class PhysicsEntity:
 
         self.last_movement = movement
 
+        self.animation.update()
+
+    def move(self, game, tilemap, frame_movement):
+        self.collisions = {'up': False, 'down': False,
+                           'right': False, 'left': False}
+        if not game.initializing or game.direction == 'u':
+            # Swept per axis, x first, so fast moves stop at the first wall instead of tunnelling.
+            # The integer rect is swept, as the overlap checks it replaces used it.
+            dx = frame_movement[0] * 2
+            hit = sweep_aabb(tilemap, self.rect(), (dx, 0))
+            if hit is not None:
+                # Snapped to the cell edge rather than pos + dx * t, which can land a hair short
+                if dx > 0:
+                    self.pos[0] = hit.cell[0] * tilemap.tile_size - self.size[0]
+                    self.collisions['right'] = True
+                else:
+                    self.pos[0] = (hit.cell[0] + 1) * tilemap.tile_size
+                    self.collisions['left'] = True
+            else:
+                self.pos[0] += dx
+
+            dy = frame_movement[1]
+            hit = sweep_aabb(tilemap, self.rect(), (0, dy))
+            if hit is not None:
+                if dy > 0:
+                    self.pos[1] = hit.cell[1] * tilemap.tile_size - self.size[1]
+                    self.collisions['down'] = True
+                else:
+                    self.pos[1] = (hit.cell[1] + 1) * tilemap.tile_size
+                    self.collisions['up'] = True
+            else:
+                self.pos[1] += dy
+        else:
+            self.pos[0] += frame_movement[0] * 2
+
         self.velocity[1] = min(5, self.velocity[1] + 0.1)
 
         if self.collisions['down'] or self.collisions['up']:
             self.velocity[1] = 0
 
-        self.animation.update()
-
     def render(self, surf, offset=(0, 0)):
         surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False),
                   (self.pos[0] - offset[0] + self.anim_offset[0],
@@ -93,37 +130,53 @@ class Enemy(PhysicsEntity):
         super().__init__(game, 'enemy', pos, size)
         self.walking = 0
 
-    def update(self, game, tilemap, movement=(0, 0)):
-        if not game.initializing:
-            if self.walking:
-                if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
-                    if (self.collisions['right'] or self.collisions['left']):
-                        self.flip = not self.flip
-                    else:
-                        movement = (
-                            movement[0] - 0.5 if self.flip else 0.5, movement[1])
-                else:
+    def think(self, game, tilemap, frames=1):
+        # Patrol and shooting decisions, standing for the next frames frames
+        movement = (0, 0)
+        step = self.chase_step(NAV_GROUND) if self.walking else None
+        if step is not None:
+            # Following the flow field, which already routes around walls and off ledges
+            if step[0]:
+                self.flip = step[0] < 0
+                movement = (step[0] * 0.5, 0)
+        elif self.walking:
+            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
+                if (self.collisions['right'] or self.collisions['left']):
                     self.flip = not self.flip
-                self.walking = max(0, self.walking - 1)
-                # shooting logic
-                if not self.walking:
-                    dis = (
-                        self.game.player.pos[0] - self.pos[0], self.game.player.pos[1] - self.pos[1])
-                    if (abs(dis[1]) < 30):
-                        if (self.flip and dis[0] < 0):
-                            self.game.projectiles.append(Projectile([self.rect(
-                            ).centerx - 7, self.rect().centery], TYPE_ENEMY_STR, PROJECTILE_SPEED, game, False))
-                            for i in range(4):
-                                self.game.sparks.append(Spark(
-                                    self.game.projectiles[-1].pos, random.random() - 0.5 + math.pi, 2 + random.random()))
-                        if (not self.flip and dis[0] > 0):
-                            self.game.projectiles.append(Projectile([self.rect(
-                            ).centerx + 7, self.rect().centery], TYPE_ENEMY_STR, PROJECTILE_SPEED, game, True))
-                            for i in range(4):
-                                self.game.sparks.append(
-                                    Spark(self.game.projectiles[-1].pos, random.random() - 0.5, 2 + random.random()))
-            elif random.random() < 0.01:
-                self.walking = random.randint(30, 60)
+                else:
+                    movement = (-0.5 if self.flip else 0.5, 0)
+            else:
+                self.flip = not self.flip
+        if self.walking:
+            self.walking = max(0, self.walking - frames)
+            # shooting logic
+            if not self.walking:
+                dis = (
+                    self.game.player.pos[0] - self.pos[0], self.game.player.pos[1] - self.pos[1])
+                # Only fire when the shot could reach the player
+                if (abs(dis[1]) < 30) and self.game.line_of_sight.visible(tilemap, self.rect().center,
+                                                                          self.game.player.rect().center):
+                    if (self.flip and dis[0] < 0):
+                        self.game.projectiles.append(self.game.projectile_pool.acquire([self.rect(
+                        ).centerx - 7, self.rect().centery], TYPE_ENEMY_STR, PROJECTILE_SPEED, game, False))
+                        for i in range(4):
+                            self.game.sparks.spawn(
+                                self.game.projectiles[-1].pos, random.random() - 0.5 + math.pi, 2 + random.random())
+                    if (not self.flip and dis[0] > 0):
+                        self.game.projectiles.append(self.game.projectile_pool.acquire([self.rect(
+                        ).centerx + 7, self.rect().centery], TYPE_ENEMY_STR, PROJECTILE_SPEED, game, True))
+                        for i in range(4):
+                            self.game.sparks.spawn(self.game.projectiles[-1].pos, random.random() - 0.5, 2 + random.random())
+        elif random.random() < chance_over(0.01, frames):
+            self.walking = random.randint(30, 60)
+        return movement
+
+    def update(self, game, tilemap, movement=(0, 0)):
+        if game.initializing:
+            self.intent = (0, 0)
+        elif self.think_frames:
+            self.intent = self.think(game, tilemap, self.think_frames)
+        movement = (movement[0] + self.intent[0], movement[1] + self.intent[1])
 
         super().update(game, tilemap, movement)
 
@@ -132,14 +185,12 @@ class Enemy(PhysicsEntity):
         else:
             self.set_action('idle')
 
-        if abs(self.game.player.dashing) >= 50:
-            if self.rect().colliderect(self.game.player.rect()):
-                self.game.screen_shake = max(16, self.game.screen_shake)
-                for i in range(15):
-                    angle = random.random() * math.pi * 2
-                    self.game.sparks.append(
-                        Spark(self.rect().center, angle, 2 + random.random(), (135, 23, 45)))
-                return True
+    def dash_hit(self):
+        self.game.screen_shake = max(16, self.game.screen_shake)
+        for i in range(15):
+            angle = random.random() * math.pi * 2
+            self.game.sparks.spawn(self.rect().center, angle, 2 + random.random(), (135, 23, 45))
+        return True
 
     def render(self, surf, offset=(0, 0)):
         super().render(surf, offset)
@@ -189,6 +240,8 @@ class Player(PhysicsEntity):
                     self.set_action('idle')
 
             if abs(self.dashing) in (60, 50):
+                velocities = []
+                frames = []
                 for i in range(4):
                     # The possible values for speed will be in the range of 0.628  (inclusive) to 6.28319 (inclusive).
                     angle = random.random() * math.pi * 2
@@ -205,8 +258,9 @@ class Player(PhysicsEntity):
                     pvelocity :  [-0.5652299967475001, -0.1926130560785]`
                         """
 
-                    self.game.particles.append(Particle(self.game, PARTICLE_STR, self.rect(
-                    ).center, velocity=pvelocity, frame=random.randint(0, 7)))
+                    velocities.append(pvelocity)
+                    frames.append(random.randint(0, 7))
+                self.game.particles.spawn_batch(PARTICLE_STR, [self.rect().center] * 4, velocities, frames)
 
             if self.dashing > 0:
                 self.dashing = max(0, self.dashing - 1)
@@ -219,8 +273,8 @@ class Player(PhysicsEntity):
                     self.velocity[0] *= 0.3
                 pvelocity = [abs(self.dashing) /
                              self.dashing * random.random() * 3, 0]
-                self.game.particles.append(Particle(self.game, PARTICLE_STR, self.rect(
-                ).center, velocity=pvelocity, frame=random.randint(0, 7)))
+                self.game.particles.spawn(PARTICLE_STR, self.rect().center, velocity=pvelocity,
+                                          frame=random.randint(0, 7))
 
             if self.velocity[0] > 0:
                 self.velocity[0] = max(self.velocity[0] - 0.1, 0)
@@ -260,17 +314,16 @@ class Player(PhysicsEntity):
 
     def shoot(self):
         if self.flip:
-            self.game.projectiles.append(Projectile([self.rect(
+            self.game.projectiles.append(self.game.projectile_pool.acquire([self.rect(
             ).centerx - 7, self.rect().centery], TYPE_PLAYER_STR, PROJECTILE_SPEED, self.game, False))
             for i in range(4):
-                self.game.sparks.append(Spark(
-                    self.game.projectiles[-1].pos, random.random() - 0.5 + math.pi, 2 + random.random()))
+                self.game.sparks.spawn(
+                    self.game.projectiles[-1].pos, random.random() - 0.5 + math.pi, 2 + random.random())
         else:
-            self.game.projectiles.append(Projectile([self.rect(
+            self.game.projectiles.append(self.game.projectile_pool.acquire([self.rect(
             ).centerx + 7, self.rect().centery], TYPE_PLAYER_STR, PROJECTILE_SPEED, self.game, True))
             for i in range(4):
-                self.game.sparks.append(
-                    Spark(self.game.projectiles[-1].pos, random.random() - 0.5, 2 + random.random()))
+                self.game.sparks.spawn(self.game.projectiles[-1].pos, random.random() - 0.5, 2 + random.random())
 
     def throw(self):
         self.game.throwables.append(
@@ -288,20 +341,37 @@ class FloatingEnemy(PhysicsEntity):
         self.init_pos_x = pos[0]
         self.init_pos_y = pos[1]
 
-    def update(self, game, tilemap, movement=(0, 0)):
+    def think(self, game, tilemap, frames=1):
+        # Patrol decisions, standing for the next frames frames
+        movement = (0, 0)
         position_offset = self.init_pos_x - self.pos[0]
-        if not game.initializing:
-            if self.walking:
-                if self.collisions['right'] or self.collisions['left'] or position_offset <= -60 or position_offset >= 60:
-                    self.flip = not self.flip
-                    self.init_pos_x = self.pos[0]
-                else:
-                    movement = (
-                        movement[0] - 0.25 if self.flip else 0.25, movement[1])
-                self.walking = max(0, self.walking - 1)
-            elif random.random() < 0.1:
-                self.walking = 60
-        # Make the enemy float above the surface
+        step = self.chase_step(NAV_AIR) if self.walking else None
+        if step is not None and step != (0, 0):
+            if step[0]:
+                self.flip = step[0] < 0
+            # Patrol resumes around wherever the chase ends
+            self.init_pos_x = self.pos[0]
+            movement = (step[0] * 0.25, step[1] * 0.25)
+            self.walking = max(0, self.walking - frames)
+        elif self.walking:
+            if self.collisions['right'] or self.collisions['left'] or position_offset <= -60 or position_offset >= 60:
+                self.flip = not self.flip
+                self.init_pos_x = self.pos[0]
+            else:
+                movement = (-0.25 if self.flip else 0.25, 0)
+            self.walking = max(0, self.walking - frames)
+        elif random.random() < chance_over(0.1, frames):
+            self.walking = 60
+        return movement
+
+    def update(self, game, tilemap, movement=(0, 0)):
+        if game.initializing:
+            self.intent = (0, 0)
+        elif self.think_frames:
+            self.intent = self.think(game, tilemap, self.think_frames)
+        movement = (movement[0] + self.intent[0], movement[1])
+        # Make the enemy float above the surface; chasing up or down moves that surface
+        self.init_pos_y += self.intent[1]
         self.pos[1] = self.init_pos_y - self.size[1] - self.float_height
 
         # Bobbing motion
@@ -315,5 +385,14 @@ class FloatingEnemy(PhysicsEntity):
         else:
             self.set_action('idle')
 
+    def park(self):
+        # Compact state kept while the enemy is away from the camera
+        return (self.pos[0], self.pos[1], self.init_pos_x, self.init_pos_y,
+                self.flip, self.walking, self.bob_offset)
+
+    def unpark(self, record):
+        self.pos[0], self.pos[1], self.init_pos_x, self.init_pos_y, \
+            self.flip, self.walking, self.bob_offset = record
+
     def render(self, surf, offset=(0, 0)):
         super().render(surf, offset)
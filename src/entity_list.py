@@ -0,0 +1,61 @@
+class EntityList:
+    # Dense container for the per-frame update loops. kill() only marks an object;
+    # compact() then swap-removes everything marked in one pass, so loops can kill
+    # while iterating without copying the list or searching it. Iteration skips
+    # killed objects and does not reach objects appended during the loop, which are
+    # first visited next frame, as with iterating a copy. Compaction moves the last
+    # objects into the freed slots, so order is not kept across it.
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.dead = set()
+        self.cursor = -1
+
+    def __len__(self):
+        return len(self.items) - len(self.dead)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __iter__(self):
+        count = len(self.items)
+        cursor = self.cursor
+        try:
+            for index in range(count):
+                if index in self.dead:
+                    continue
+                self.cursor = index
+                yield self.items[index]
+        finally:
+            self.cursor = cursor
+
+    def append(self, item):
+        self.items.append(item)
+
+    def extend(self, items):
+        self.items.extend(items)
+
+    def kill(self, item):
+        # O(1) for the object the loop is on, a search for any other
+        if 0 <= self.cursor < len(self.items) and self.items[self.cursor] is item:
+            self.dead.add(self.cursor)
+            return
+        for index, other in enumerate(self.items):
+            if other is item and index not in self.dead:
+                self.dead.add(index)
+                return
+        raise ValueError('EntityList.kill(item): item not in list')
+
+    def compact(self):
+        # Highest slots first, so the object swapped down is never a marked one
+        for index in sorted(self.dead, reverse=True):
+            last = self.items.pop()
+            if index < len(self.items):
+                self.items[index] = last
+        self.dead = set()
+
+    def clear(self):
+        self.items = []
+        self.dead = set()
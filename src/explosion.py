@@ -3,7 +3,32 @@ import random
 import math
 
 from src.utils import EXPLOSION_GRENADE_COLORS, SIZE_16
-from src.spark import Spark
+from src.entity_list import EntityList
+
+EXPLOSION_MIN_RADIUS = 2
+EXPLOSION_MAX_RADIUS = 6
+# Alpha levels of the sprite cache, counted down from opaque. Matches the fade of a
+# particle per update, so every alpha a particle reaches has its own sprite.
+EXPLOSION_ALPHA_STEP = 7
+
+
+class ExplosionSprites:
+    # Every look an explosion particle can take, rasterised once: a circle per
+    # radius, colour and alpha level
+    def __init__(self, colors=EXPLOSION_GRENADE_COLORS, step=EXPLOSION_ALPHA_STEP):
+        self.step = step
+        self.levels = -(-255 // step)
+        self.sprites = {}
+        for radius in range(EXPLOSION_MIN_RADIUS, EXPLOSION_MAX_RADIUS + 1):
+            for color in colors:
+                for level in range(self.levels + 1):
+                    surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+                    pygame.draw.circle(surface, (*color, max(0, 255 - level * step)), (radius, radius), radius)
+                    self.sprites[(radius, tuple(color), level)] = surface
+
+    def get(self, radius, color, alpha):
+        level = min(self.levels, max(0, round((255 - alpha) / self.step)))
+        return self.sprites[(radius, color, level)]
 
 # Explosion class
 
@@ -12,37 +37,55 @@ class Explosion:
     def __init__(self, game, pos):
         self.pos = list(pos)
         self.game = game
-        self.particles = [Particle(self.pos[0], self.pos[1])
-                          for _ in range(20)]
+        self.particles = EntityList(Particle(self.pos[0], self.pos[1])
+                                    for _ in range(20))
         self.flag = False
         self.effect_timer = 30
+        self.culled = 0
 
     def rect(self):
         return pygame.Rect(self.pos[0] - SIZE_16, self.pos[1] - SIZE_16,
                            SIZE_16, SIZE_16)
         
     def update(self, dt):
+        rect = self.rect()
+        # Radius of the circle around the blast rect, for the broadphase query
+        reach = math.hypot(rect.width, rect.height) / 2
+        hits = [enemy for enemy in self.game.broadphase.enemies_in_radius(rect.center, reach)
+                if enemy.rect().colliderect(rect)]
         for particle in self.particles:
             self.flag = particle.update(dt)
-            for enemy in self.game.enemies.copy():
-                if enemy.rect().colliderect(self.rect()):
-                    if self.effect_timer >= 0:
-                        self.game.enemies.remove(enemy)
-                        self.game.screen_shake = max(16, self.game.screen_shake)
-                        for i in range(15):
-                            angle = random.random() * math.pi * 2
-                            self.game.sparks.append(
-                                Spark(enemy.rect().center, angle, 2 + random.random(), (135, 23, 45)))
-                        return 0
-                    else:
-                        self.effect_timer = max(0, self.effect_timer - 1)
+            for enemy in hits:
+                if self.effect_timer >= 0:
+                    self.game.enemies.remove(enemy)
+                    self.game.broadphase.remove(enemy)
+                    self.game.screen_shake = max(16, self.game.screen_shake)
+                    for i in range(15):
+                        angle = random.random() * math.pi * 2
+                        self.game.sparks.spawn(enemy.rect().center, angle, 2 + random.random(), (135, 23, 45))
+                    return 0
+                else:
+                    self.effect_timer = max(0, self.effect_timer - 1)
             if self.flag:
-                self.particles.remove(particle)
+                self.particles.kill(particle)
+        self.particles.compact()
         return self.flag
 
     def render(self, surf, offset=(0, 0)):
+        sprites = self.game.explosion_sprites
+        width, height = surf.get_size()
+        blit_sequence = []
+        self.culled = 0
         for particle in self.particles:
-            particle.render(surf, offset)
+            if particle.alpha > 0:
+                x = particle.x - particle.radius - offset[0]
+                y = particle.y - particle.radius - offset[1]
+                size = particle.radius * 2
+                if x < width and y < height and x + size > 0 and y + size > 0:
+                    blit_sequence.append((sprites.get(particle.radius, particle.color, particle.alpha), (x, y)))
+                else:
+                    self.culled += 1
+        surf.blits(blit_sequence, doreturn=False)
 
 # Particle class
 
@@ -51,7 +94,7 @@ class Particle:
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.radius = random.randint(2, 6)
+        self.radius = random.randint(EXPLOSION_MIN_RADIUS, EXPLOSION_MAX_RADIUS)
         self.color = random.choice(EXPLOSION_GRENADE_COLORS)
         self.angle = random.uniform(0, 2 * math.pi)
         self.speed = random.uniform(5, 15)
@@ -67,12 +110,3 @@ class Particle:
         if self.alpha <= 0:
             return True
         return False
-
-    def render(self, surf, offset=(0, 0)):
-        if self.alpha > 0:
-            surface = pygame.Surface(
-                (self.radius * 2, self.radius * 2), pygame.SRCALPHA)
-            pygame.draw.circle(surface, (*self.color, self.alpha),
-                               (self.radius, self.radius), self.radius)
-            surf.blit(surface, (self.x - self.radius -
-                      offset[0], self.y - self.radius - offset[1]))
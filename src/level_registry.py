@@ -0,0 +1,162 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.map_format import read_map, map_path, is_streaming_map
+from src.streaming_tilemap import StreamingTilemap
+from src.tilemap import Tilemap
+from src.utils import (MAPS_PATH, JSON_LVL_STR, JSON_LARGE_DECOR_STR, JSON_SPAWNER_STR, TILE_SIZE)
+
+# Number of parsed levels kept in memory
+LEVEL_CACHE_SIZE = 8
+
+
+def level_file(level):
+    return MAPS_PATH + str(level) + '.json'
+
+
+def level_number(file_name):
+    # Doors name their target by file, e.g. '1.json'
+    return int(os.path.splitext(os.path.basename(file_name))[0])
+
+
+class LevelRegistry:
+    # Walks the next_lvl door graph once, starting from the first level
+    def __init__(self, pack=None, start_level=0):
+        self.neighbours = {}
+        queue = [start_level]
+        while queue:
+            level = queue.pop(0)
+            if level in self.neighbours:
+                continue
+            lvl = read_map(map_path(level_file(level), pack), pack)[JSON_LVL_STR]
+            doors = lvl['next_lvl'] if lvl else []
+            self.neighbours[level] = list(dict.fromkeys(level_number(door['lvl'])
+                                                        for door in doors if door.get('lvl')))
+            queue.extend(self.neighbours[level])
+
+    def __len__(self):
+        return len(self.neighbours)
+
+    def __contains__(self, level):
+        return level in self.neighbours
+
+    def last_level(self):
+        return max(self.neighbours)
+
+    def door_target(self, door, level):
+        # Level behind a door; doors without a known target keep the old "next level" rule
+        if door.get('lvl'):
+            target = level_number(door['lvl'])
+            if target in self.neighbours:
+                return target
+        return min(level + 1, self.last_level())
+
+
+class Level:
+    def __init__(self, tilemap, trees, spawners):
+        self.tilemap = tilemap
+        self.trees = trees
+        self.spawners = spawners
+
+
+class LevelTemplate:
+    # A parsed level with its spawners already extracted. Templates are shared
+    # between instances and never modified; Tilemap.load_data copies the tiles.
+    # Streaming levels keep only their path and the tile pairs left out of their chunks.
+    def __init__(self, map_data, trees, spawners, stream_path=None, excluded=()):
+        self.map_data = map_data
+        self.trees = trees
+        self.spawners = spawners
+        self.stream_path = stream_path
+        self.excluded = frozenset(excluded)
+
+
+def parse_level(game, level):
+    path = map_path(level_file(level), game.pack)
+    if is_streaming_map(path):
+        tilemap = StreamingTilemap(game, tile_size=TILE_SIZE)
+    else:
+        tilemap = Tilemap(game, tile_size=TILE_SIZE)
+    tilemap.load(path, game.pack)
+    trees = tilemap.extract([(JSON_LARGE_DECOR_STR, 2)], keep=True)
+    spawners = tilemap.extract([(JSON_SPAWNER_STR, 1)])
+    if is_streaming_map(path):
+        return LevelTemplate(None, trees, spawners, path, tilemap.excluded)
+    return LevelTemplate(tilemap.map_data(), trees, spawners)
+
+
+class LevelCache:
+    # LRU of level templates, shared by the main thread and the prefetch thread. A
+    # level being parsed has a Future in parsing, so a second thread asking for it
+    # waits for that parse instead of starting its own.
+    def __init__(self, game, size=LEVEL_CACHE_SIZE):
+        self.game = game
+        self.size = size
+        self.templates = OrderedDict()
+        self.parsing = {}
+        self.lock = threading.Lock()
+
+    def template(self, level):
+        with self.lock:
+            if level in self.templates:
+                self.templates.move_to_end(level)
+                return self.templates[level]
+            future = self.parsing.get(level)
+            owner = future is None
+            if owner:
+                future = self.parsing[level] = Future()
+        if not owner:
+            return future.result()
+        try:
+            template = parse_level(self.game, level)
+        except BaseException as error:
+            with self.lock:
+                del self.parsing[level]
+            future.set_exception(error)
+            raise
+        with self.lock:
+            del self.parsing[level]
+            self.templates[level] = template
+            self.templates.move_to_end(level)
+            while len(self.templates) > self.size:
+                self.templates.popitem(last=False)
+        future.set_result(template)
+        return template
+
+    def instantiate(self, level):
+        template = self.template(level)
+        if template.stream_path is not None:
+            tilemap = StreamingTilemap(self.game, tile_size=TILE_SIZE)
+            tilemap.load(template.stream_path, self.game.pack)
+            tilemap.excluded = set(template.excluded)
+        else:
+            tilemap = Tilemap(self.game, tile_size=TILE_SIZE)
+            tilemap.load_data(template.map_data)
+        return Level(tilemap, template.trees, template.spawners)
+
+
+class LevelPrefetcher:
+    # Builds levels on a background thread so that switching to one is a swap
+    def __init__(self, game, cache):
+        self.game = game
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='level-prefetch')
+        self.pending = {}
+
+    def prefetch(self, levels):
+        for level in list(self.pending):
+            if level not in levels:
+                self.pending.pop(level).cancel()
+        for level in levels:
+            if level not in self.pending:
+                self.pending[level] = self.executor.submit(self.cache.instantiate, level)
+
+    def take(self, level):
+        # A level already being built is waited for, which is never slower than building
+        # it here. One still queued behind other levels is built here instead.
+        future = self.pending.pop(level, None)
+        if future is None or future.cancel():
+            return self.cache.instantiate(level)
+        return future.result()
@@ -0,0 +1,40 @@
+from src.collision import raycast
+
+# Cached cell pairs kept before the cache is cleared
+LOS_CACHE_SIZE = 4096
+
+
+class LineOfSight:
+    # Visibility between two points, decided by a grid DDA ray between the centres of
+    # their cells. Results are cached per (from cell, to cell) pair and dropped when
+    # the tilemap changes solidity or a different tilemap is queried.
+    def __init__(self, cache_size=LOS_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = {}
+        self.tilemap = None
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def visible(self, tilemap, source, target):
+        if tilemap is not self.tilemap or tilemap.version != self.version:
+            self.tilemap = tilemap
+            self.version = tilemap.version
+            self.cache = {}
+        size = tilemap.tile_size
+        key = (int(source[0] // size), int(source[1] // size), int(target[0] // size), int(target[1] // size))
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        origin = ((key[0] + 0.5) * size, (key[1] + 0.5) * size)
+        delta = ((key[2] + 0.5) * size - origin[0], (key[3] + 0.5) * size - origin[1])
+        result = raycast(tilemap, origin, delta) is None
+        if len(self.cache) >= self.cache_size:
+            self.cache = {}
+        self.cache[key] = result
+        return result
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'cached': len(self.cache)}
@@ -0,0 +1,287 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from src.utils import (JSON_TILEMAP_STR, JSON_TYPE_STR, JSON_VARIANT_STR, JSON_POS_STR, JSON_TILE_SIZE_STR,
+                       JSON_OFFGRID_STR, JSON_MAP_DIMS_STR, JSON_MAP_WIDTH_STR, JSON_MAP_HEIGHT_STR,
+                       JSON_LVL_STR, BINARY_MAP_EXT, STREAMING_MAP_EXT)
+
+# Binary map layout, all little endian:
+#   header      magic, version, tile_size, grid origin x/y, grid width/height, map_dims width/height
+#   strings     u16 count, then u16 length + utf-8 bytes each (tile types, door directions and files)
+#   palette     u16 count, then (u16 type string, u16 variant) per entry
+#   grid        width * height u16 tile ids, row major; 0 is empty, n is palette entry n - 1
+#   offgrid     u32 count, then (u16 palette entry, f64 x, f64 y) per tile
+#   lvl         u8 present flag, i32 cur_lvl, u16 pre_dir string, u16 door count,
+#               then (u16 dir, u16 next_dir, u16 lvl file, i32 x, i32 y) per door
+MAP_MAGIC = b'TMAP'
+MAP_VERSION = 1
+NO_STRING = 0xFFFF
+NO_DIM = -1
+
+HEADER = struct.Struct('<4sHHiiIIii')
+COUNT_16 = struct.Struct('<H')
+COUNT_32 = struct.Struct('<I')
+LVL_HEADER = struct.Struct('<BiHH')
+PALETTE_DTYPE = np.dtype([('type', '<u2'), ('variant', '<u2')])
+OFFGRID_DTYPE = np.dtype([('id', '<u2'), ('x', '<f8'), ('y', '<f8')])
+DOOR_DTYPE = np.dtype([('dir', '<u2'), ('next_dir', '<u2'), ('lvl', '<u2'), ('x', '<i4'), ('y', '<i4')])
+
+# Streaming map layout, all little endian:
+#   header      magic, version, chunk size in tiles, chunk count, meta length
+#   meta        a binary map without tiles, holding tile_size, map_dims and lvl
+#   index       per chunk: i32 chunk x, i32 chunk y, u64 offset, u32 length
+#   chunks      one binary map per chunk with its tiles, and the offgrid decor whose
+#               position falls inside it
+STREAM_MAGIC = b'TCHK'
+STREAM_VERSION = 1
+STREAM_CHUNK_SIZE = 16
+
+STREAM_HEADER = struct.Struct('<4sHHII')
+CHUNK_ENTRY = struct.Struct('<iiQI')
+
+
+class MapFormatError(Exception):
+    pass
+
+
+def encode_map(map_data):
+    strings = {}
+    palette = {}
+
+    def string_id(value):
+        if value is None:
+            return NO_STRING
+        return strings.setdefault(value, len(strings))
+
+    def palette_id(tile):
+        id_pair = (string_id(tile[JSON_TYPE_STR]), tile[JSON_VARIANT_STR])
+        return palette.setdefault(id_pair, len(palette)) + 1
+
+    tiles = list(map_data[JSON_TILEMAP_STR].values())
+    xs = np.array([int(tile[JSON_POS_STR][0]) for tile in tiles], dtype=np.int64)
+    ys = np.array([int(tile[JSON_POS_STR][1]) for tile in tiles], dtype=np.int64)
+    if tiles:
+        origin = (int(xs.min()), int(ys.min()))
+        width = int(xs.max()) - origin[0] + 1
+        height = int(ys.max()) - origin[1] + 1
+    else:
+        origin = (0, 0)
+        width = height = 0
+    grid = np.zeros((height, width), dtype='<u2')
+    grid[ys - origin[1], xs - origin[0]] = [palette_id(tile) for tile in tiles]
+
+    offgrid_tiles = list(map_data[JSON_OFFGRID_STR])
+    offgrid = np.zeros(len(offgrid_tiles), dtype=OFFGRID_DTYPE)
+    for i, tile in enumerate(offgrid_tiles):
+        offgrid[i] = (palette_id(tile), tile[JSON_POS_STR][0], tile[JSON_POS_STR][1])
+
+    lvl = map_data.get(JSON_LVL_STR)
+    doors = np.zeros(len(lvl['next_lvl']) if lvl else 0, dtype=DOOR_DTYPE)
+    if lvl:
+        lvl_header = LVL_HEADER.pack(1, lvl.get('cur_lvl', 0), string_id(lvl.get('pre_dir')), len(doors))
+        for i, door in enumerate(lvl['next_lvl']):
+            doors[i] = (string_id(door.get('dir')), string_id(door.get('next_dir')),
+                        string_id(door.get('lvl')), door['pos'][0], door['pos'][1])
+    else:
+        lvl_header = LVL_HEADER.pack(0, 0, NO_STRING, 0)
+
+    map_dims = map_data.get(JSON_MAP_DIMS_STR)
+    parts = [HEADER.pack(MAP_MAGIC, MAP_VERSION, map_data[JSON_TILE_SIZE_STR], origin[0], origin[1],
+                         width, height,
+                         map_dims[JSON_MAP_WIDTH_STR] if map_dims else NO_DIM,
+                         map_dims[JSON_MAP_HEIGHT_STR] if map_dims else NO_DIM)]
+    parts.append(COUNT_16.pack(len(strings)))
+    for value in strings:
+        encoded = value.encode('utf-8')
+        parts.append(COUNT_16.pack(len(encoded)))
+        parts.append(encoded)
+    palette_table = np.array(list(palette), dtype=PALETTE_DTYPE)
+    parts.append(COUNT_16.pack(len(palette_table)))
+    parts.append(palette_table.tobytes())
+    parts.append(grid.tobytes())
+    parts.append(COUNT_32.pack(len(offgrid)))
+    parts.append(offgrid.tobytes())
+    parts.append(lvl_header)
+    parts.append(doors.tobytes())
+    return b''.join(parts)
+
+
+def decode_map(data):
+    # Returns map data shaped like the JSON maps, except that the tilemap is keyed by (x, y)
+    data = memoryview(data)
+    magic, version, tile_size, origin_x, origin_y, width, height, map_width, map_height = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAP_MAGIC:
+        raise MapFormatError('Not a binary map')
+    if version != MAP_VERSION:
+        raise MapFormatError('Unsupported binary map version ' + str(version))
+    offset = HEADER.size
+
+    strings = []
+    count = COUNT_16.unpack_from(data, offset)[0]
+    offset += COUNT_16.size
+    for i in range(count):
+        length = COUNT_16.unpack_from(data, offset)[0]
+        offset += COUNT_16.size
+        strings.append(str(data[offset:offset + length], 'utf-8'))
+        offset += length
+
+    count = COUNT_16.unpack_from(data, offset)[0]
+    offset += COUNT_16.size
+    palette = [(strings[t_type], variant) for t_type, variant in
+               np.frombuffer(data, PALETTE_DTYPE, count, offset).tolist()]
+    offset += count * PALETTE_DTYPE.itemsize
+
+    grid = np.frombuffer(data, '<u2', width * height, offset).reshape(height, width)
+    offset += grid.nbytes
+    ys, xs = np.nonzero(grid)
+    tilemap = {}
+    for x, y, tile_id in zip((xs + origin_x).tolist(), (ys + origin_y).tolist(), grid[ys, xs].tolist()):
+        t_type, variant = palette[tile_id - 1]
+        tilemap[(x, y)] = {JSON_TYPE_STR: t_type, JSON_VARIANT_STR: variant, JSON_POS_STR: [x, y]}
+
+    count = COUNT_32.unpack_from(data, offset)[0]
+    offset += COUNT_32.size
+    offgrid = []
+    for tile_id, x, y in np.frombuffer(data, OFFGRID_DTYPE, count, offset).tolist():
+        t_type, variant = palette[tile_id - 1]
+        offgrid.append({JSON_TYPE_STR: t_type, JSON_VARIANT_STR: variant, JSON_POS_STR: [x, y]})
+    offset += count * OFFGRID_DTYPE.itemsize
+
+    present, cur_lvl, pre_dir, count = LVL_HEADER.unpack_from(data, offset)
+    offset += LVL_HEADER.size
+    lvl = []
+    if present:
+        lvl = {'cur_lvl': cur_lvl, 'pre_dir': string_or_none(strings, pre_dir), 'next_lvl': []}
+        for door_dir, next_dir, lvl_file, x, y in np.frombuffer(data, DOOR_DTYPE, count, offset).tolist():
+            door = {'dir': string_or_none(strings, door_dir)}
+            if next_dir != NO_STRING:
+                door['next_dir'] = strings[next_dir]
+            door['lvl'] = string_or_none(strings, lvl_file)
+            door['pos'] = [x, y]
+            lvl['next_lvl'].append(door)
+
+    map_dims = []
+    if map_width != NO_DIM:
+        map_dims = {JSON_MAP_WIDTH_STR: map_width, JSON_MAP_HEIGHT_STR: map_height}
+    return {JSON_TILEMAP_STR: tilemap, JSON_TILE_SIZE_STR: tile_size, JSON_OFFGRID_STR: offgrid,
+            JSON_MAP_DIMS_STR: map_dims, JSON_LVL_STR: lvl}
+
+
+def map_chunk(map_data, chunk_size):
+    tile_size = map_data[JSON_TILE_SIZE_STR]
+    chunks = {}
+    for tile in map_data[JSON_TILEMAP_STR].values():
+        loc = (int(tile[JSON_POS_STR][0]), int(tile[JSON_POS_STR][1]))
+        chunks.setdefault((loc[0] // chunk_size, loc[1] // chunk_size), ({}, []))[0][loc] = tile
+    for tile in map_data[JSON_OFFGRID_STR]:
+        chunk = (int(tile[JSON_POS_STR][0] // (chunk_size * tile_size)),
+                 int(tile[JSON_POS_STR][1] // (chunk_size * tile_size)))
+        chunks.setdefault(chunk, ({}, []))[1].append(tile)
+    return chunks
+
+
+def encode_streaming_map(map_data, chunk_size=STREAM_CHUNK_SIZE):
+    tile_size = map_data[JSON_TILE_SIZE_STR]
+    meta = encode_map({JSON_TILEMAP_STR: {}, JSON_TILE_SIZE_STR: tile_size, JSON_OFFGRID_STR: [],
+                       JSON_MAP_DIMS_STR: map_data.get(JSON_MAP_DIMS_STR), JSON_LVL_STR: map_data.get(JSON_LVL_STR)})
+    payloads = []
+    for chunk, (tiles, offgrid) in sorted(map_chunk(map_data, chunk_size).items()):
+        payloads.append((chunk, encode_map({JSON_TILEMAP_STR: tiles, JSON_TILE_SIZE_STR: tile_size,
+                                            JSON_OFFGRID_STR: offgrid, JSON_MAP_DIMS_STR: [],
+                                            JSON_LVL_STR: []})))
+    parts = [STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size, len(payloads), len(meta)), meta]
+    offset = STREAM_HEADER.size + len(meta) + CHUNK_ENTRY.size * len(payloads)
+    for chunk, payload in payloads:
+        parts.append(CHUNK_ENTRY.pack(chunk[0], chunk[1], offset, len(payload)))
+        offset += len(payload)
+    parts.extend(payload for chunk, payload in payloads)
+    return b''.join(parts)
+
+
+def decode_streaming_header(data):
+    # Returns (chunk size, meta map data, {chunk: (offset, length)}); chunks are
+    # decoded one at a time with decode_map(data[offset:offset + length])
+    data = memoryview(data)
+    magic, version, chunk_size, count, meta_length = STREAM_HEADER.unpack_from(data, 0)
+    if magic != STREAM_MAGIC:
+        raise MapFormatError('Not a streaming map')
+    if version != STREAM_VERSION:
+        raise MapFormatError('Unsupported streaming map version ' + str(version))
+    offset = STREAM_HEADER.size
+    meta = decode_map(data[offset:offset + meta_length])
+    offset += meta_length
+    chunk_index = {}
+    for i in range(count):
+        cx, cy, chunk_offset, length = CHUNK_ENTRY.unpack_from(data, offset)
+        chunk_index[(cx, cy)] = (chunk_offset, length)
+        offset += CHUNK_ENTRY.size
+    return chunk_size, meta, chunk_index
+
+
+def string_or_none(strings, string_id):
+    if string_id == NO_STRING:
+        return None
+    return strings[string_id]
+
+
+def is_binary_map(path):
+    return os.path.splitext(path)[1] == BINARY_MAP_EXT
+
+
+def is_streaming_map(path):
+    return os.path.splitext(path)[1] == STREAMING_MAP_EXT
+
+
+def map_buffer(path, pack=None):
+    # Read-only view of a map file, memory-mapped so that chunks are only paged in when decoded
+    if pack is not None and path in pack:
+        return pack.read(path)
+    with open(path, 'rb') as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def read_map(path, pack=None):
+    # Streaming maps only return their meta data here, their tiles are left on disk
+    if is_streaming_map(path):
+        return decode_streaming_header(map_buffer(path, pack))[1]
+    if pack is not None and path in pack:
+        data = pack.read(path)
+        if is_binary_map(path):
+            return decode_map(data)
+        return json.loads(bytes(data))
+    if is_binary_map(path):
+        with open(path, 'rb') as f:
+            return decode_map(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_map(path, map_data):
+    if is_streaming_map(path):
+        with open(path, 'wb') as f:
+            f.write(encode_streaming_map(map_data))
+    elif is_binary_map(path):
+        with open(path, 'wb') as f:
+            f.write(encode_map(map_data))
+    else:
+        with open(path, 'w') as f:
+            json.dump(map_data, f)
+
+
+def map_path(path, pack=None):
+    # Prefer a converted map next to a JSON map when there is one, streaming first.
+    # A converted map older than its JSON is left out, so edits to the JSON show up
+    # without converting again.
+    for ext in (STREAMING_MAP_EXT, BINARY_MAP_EXT):
+        converted_path = os.path.splitext(path)[0] + ext
+        if pack is not None and converted_path in pack:
+            return converted_path
+        if os.path.exists(converted_path) and not (
+                os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(converted_path)):
+            return converted_path
+    return path
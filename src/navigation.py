@@ -0,0 +1,183 @@
+from collections import deque
+
+import numpy as np
+
+from src.utils import TILE_SIZE
+
+NAV_GROUND = 'ground'
+NAV_AIR = 'air'
+# Cells covered around the view, and the alignment of that area so that scrolling
+# does not rebuild the graphs on every cell
+NAV_MARGIN = 4
+NAV_ALIGN = 16
+# Enemies this close to the player, in pixels, follow the flow field instead of patrolling
+NAV_CHASE_DISTANCE = 160
+# Longest path, in cells, the flow field is searched to; past it enemies patrol
+NAV_FLOW_DEPTH = 2 * NAV_CHASE_DISTANCE // TILE_SIZE
+
+
+class Navigation:
+    # Walkable graphs over the area around the view, and one flow field per graph
+    # pointing every cell at its next step towards the player.
+    #   ground: empty cells with a solid cell below, linked to the cells beside them
+    #           and, off ledges, to where a fall straight down lands
+    #   air:    every empty cell, linked to its 4 neighbours (floating lanes)
+    # The graphs are rebuilt when the tiles or the area change. A flow field is a
+    # breadth-first search from the player's cell that is restarted when the player
+    # changes cell, and only runs as far as the farthest cell asked for a step so
+    # far, up to depth cells away.
+    def __init__(self, margin=NAV_MARGIN, align=NAV_ALIGN, depth=NAV_FLOW_DEPTH):
+        self.margin = margin
+        self.align = align
+        self.depth = depth
+        self.tilemap = None
+        self.version = None
+        self.area = None
+        self.solid = []
+        self.graphs = {NAV_GROUND: {}, NAV_AIR: {}}
+        self.flows = {}
+        self.goal = None
+        self.rebuilds = 0
+        self.flow_updates = 0
+        self.flow_cells = 0
+
+    def update(self, tilemap, camera_rect, target_rect):
+        size = tilemap.tile_size
+        area = (((camera_rect.left // size - self.margin) // self.align) * self.align,
+                ((camera_rect.top // size - self.margin) // self.align) * self.align,
+                -((-(camera_rect.right // size + self.margin + 1)) // self.align) * self.align,
+                -((-(camera_rect.bottom // size + self.margin + 1)) // self.align) * self.align)
+        if tilemap is not self.tilemap or tilemap.version != self.version or area != self.area:
+            self.tilemap = tilemap
+            self.version = tilemap.version
+            self.area = area
+            self.build()
+            self.goal = None
+        goal = (int(target_rect.centerx // size), int(target_rect.centery // size))
+        if goal != self.goal:
+            self.goal = goal
+            self.flows = {}
+
+    def inside(self, cell):
+        return self.area[0] <= cell[0] < self.area[2] and self.area[1] <= cell[1] < self.area[3]
+
+    def solid_window(self):
+        # Solid flags over the area plus the row below it, indexed [x][y] from the area corner
+        min_x, min_y, max_x, max_y = self.area
+        grid, origin = self.tilemap.solid_region(min_x, min_y, max_x, max_y + 1)
+        window = np.zeros((max_x - min_x, max_y + 1 - min_y), dtype=bool)
+        x0 = max(min_x, origin[0])
+        y0 = max(min_y, origin[1])
+        x1 = min(max_x, origin[0] + grid.shape[0])
+        y1 = min(max_y + 1, origin[1] + grid.shape[1])
+        if x0 < x1 and y0 < y1:
+            window[x0 - min_x:x1 - min_x, y0 - min_y:y1 - min_y] = \
+                grid[x0 - origin[0]:x1 - origin[0], y0 - origin[1]:y1 - origin[1]]
+        return window.tolist()
+
+    def build(self):
+        # Graphs are stored reversed, cell -> cells that lead into it, ready for the flow BFS
+        self.rebuilds += 1
+        min_x, min_y = self.area[0], self.area[1]
+        width = self.area[2] - min_x
+        height = self.area[3] - min_y
+        solid = self.solid_window()
+        air = {}
+        ground = {}
+        for x in range(width):
+            column = solid[x]
+            for y in range(height):
+                if column[y]:
+                    continue
+                links = []
+                if x > 0 and not solid[x - 1][y]:
+                    links.append((min_x + x - 1, min_y + y))
+                if x + 1 < width and not solid[x + 1][y]:
+                    links.append((min_x + x + 1, min_y + y))
+                if y > 0 and not column[y - 1]:
+                    links.append((min_x + x, min_y + y - 1))
+                if y + 1 < height and not column[y + 1]:
+                    links.append((min_x + x, min_y + y + 1))
+                air[(min_x + x, min_y + y)] = links
+        for x in range(width):
+            column = solid[x]
+            for y in range(height):
+                if column[y] or not column[y + 1]:
+                    continue
+                cell = (min_x + x, min_y + y)
+                ground.setdefault(cell, [])
+                for side in (-1, 1):
+                    landing = self.landing((cell[0] + side, cell[1]), solid)
+                    if landing is not None:
+                        ground.setdefault(landing, []).append(cell)
+        self.solid = solid
+        self.graphs = {NAV_GROUND: ground, NAV_AIR: air}
+        self.flows = {}
+
+    def landing(self, cell, solid=None):
+        # Ground cell reached by stepping into cell and falling straight down, if any
+        if solid is None:
+            solid = self.solid
+        if not self.inside(cell):
+            return None
+        x = cell[0] - self.area[0]
+        column = solid[x]
+        for y in range(cell[1] - self.area[1], len(column) - 1):
+            if column[y]:
+                return None
+            if column[y + 1]:
+                return (cell[0], self.area[1] + y)
+        return None
+
+    def search(self, kind):
+        # (flow, queue) of the search from the goal, cell -> next cell, and the
+        # (cell, depth) pairs still to expand
+        if kind in self.flows:
+            return self.flows[kind]
+        self.flow_updates += 1
+        graph = self.graphs[kind]
+        goal = self.goal
+        if kind == NAV_GROUND and goal is not None and goal not in graph:
+            # A player in the air is chased to where they will land
+            goal = self.landing(goal)
+        flow = {}
+        queue = deque()
+        if goal in graph:
+            flow[goal] = goal
+            queue.append((goal, 0))
+        self.flows[kind] = (flow, queue)
+        return flow, queue
+
+    def expand(self, kind, cell=None):
+        # Runs the search until cell is reached, or to the end without a cell
+        flow, queue = self.search(kind)
+        graph = self.graphs[kind]
+        while queue and cell not in flow:
+            current, depth = queue.popleft()
+            if depth >= self.depth:
+                queue.clear()
+                break
+            self.flow_cells += 1
+            for previous in graph[current]:
+                if previous not in flow:
+                    flow[previous] = current
+                    queue.append((previous, depth + 1))
+        return flow
+
+    def flow(self, kind):
+        return self.expand(kind)
+
+    def next_step(self, kind, pos):
+        # (dx, dy) in cells from the cell holding pos towards the player, None when
+        # the player cannot be reached, (0, 0) once there
+        if self.tilemap is None:
+            return None
+        size = self.tilemap.tile_size
+        cell = (int(pos[0] // size), int(pos[1] // size))
+        following = self.expand(kind, cell).get(cell)
+        if following is None:
+            return None
+        return (following[0] - cell[0], following[1] - cell[1])
+
+    def stats(self):
+        return {'rebuilds': self.rebuilds, 'flow_updates': self.flow_updates, 'flow_cells': self.flow_cells}
@@ -0,0 +1,125 @@
+import hashlib
+import mmap
+import os
+import struct
+
+import pygame
+
+# Pack file layout, all little endian:
+#   header  magic, version, entry count, index offset
+#   blobs   raw entry data, each aligned to BLOB_ALIGN; identical contents are stored once
+#   index   per entry: u16 name length + utf-8 name, u8 kind, u8 flags, u64 offset, u64 length,
+#           u16 width, u16 height, 4s pixel format, 20s sha1 of the blob
+# Image blobs hold pixels already converted to IMAGE_FORMAT, so loading one is a
+# pygame.image.frombuffer over the memory-mapped file rather than a decode. BGRA is
+# the byte order of the usual XRGB8888 display; its alpha bytes are only padding, so
+# the surfaces are used as they are. A display with another layout gets a converted
+# copy, as utils.load_image makes.
+PACK_MAGIC = b'GPAK'
+PACK_VERSION = 1
+BLOB_ALIGN = 16
+IMAGE_FORMAT = 'BGRA'
+
+KIND_FILE = 0
+KIND_IMAGE = 1
+FLAG_COLORKEY = 1
+
+HEADER = struct.Struct('<4sHIQ')
+NAME_LENGTH = struct.Struct('<H')
+INDEX_ENTRY = struct.Struct('<BBQQHH4s20s')
+
+
+class PackError(Exception):
+    pass
+
+
+def is_stale(path, sources):
+    # A pack built before any of its source files changed is out of date
+    built = os.path.getmtime(path)
+    return any(os.path.getmtime(source) > built for source in sources)
+
+
+class PackWriter:
+    def __init__(self):
+        self.entries = {}
+        self.blobs = {}
+
+    def add_blob(self, data):
+        digest = hashlib.sha1(data).digest()
+        self.blobs.setdefault(digest, data)
+        return digest
+
+    def add_file(self, name, data):
+        self.entries[name] = (KIND_FILE, 0, 0, 0, b'', self.add_blob(bytes(data)))
+
+    def add_image(self, name, surf, colorkey=True):
+        data = pygame.image.tobytes(surf, IMAGE_FORMAT)
+        self.entries[name] = (KIND_IMAGE, FLAG_COLORKEY if colorkey else 0, surf.get_width(),
+                              surf.get_height(), IMAGE_FORMAT.encode('ascii'), self.add_blob(data))
+
+    def write(self, path):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, len(self.entries), 0))
+            offsets = {}
+            for digest, data in self.blobs.items():
+                f.write(bytes(-f.tell() % BLOB_ALIGN))
+                offsets[digest] = f.tell()
+                f.write(data)
+            index_offset = f.tell()
+            for name, (kind, flags, width, height, pixel_format, digest) in self.entries.items():
+                encoded = name.encode('utf-8')
+                f.write(NAME_LENGTH.pack(len(encoded)))
+                f.write(encoded)
+                f.write(INDEX_ENTRY.pack(kind, flags, offsets[digest], len(self.blobs[digest]),
+                                         width, height, pixel_format, digest))
+            f.seek(0)
+            f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, len(self.entries), index_offset))
+
+
+class Pack:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            # Copy-on-write mapping: surfaces made over it can never write back to the file
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.view = memoryview(self.data)
+        magic, version, count, offset = HEADER.unpack_from(self.view, 0)
+        if magic != PACK_MAGIC:
+            raise PackError('Not a pack file: ' + path)
+        if version != PACK_VERSION:
+            raise PackError('Unsupported pack version ' + str(version))
+        self.entries = {}
+        for i in range(count):
+            length = NAME_LENGTH.unpack_from(self.view, offset)[0]
+            offset += NAME_LENGTH.size
+            name = str(self.view[offset:offset + length], 'utf-8')
+            offset += length
+            self.entries[name] = INDEX_ENTRY.unpack_from(self.view, offset)
+            offset += INDEX_ENTRY.size
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def read(self, name):
+        entry = self.entries[name]
+        return self.view[entry[2]:entry[2] + entry[3]]
+
+    def load_image(self, name):
+        kind, flags, offset, length, width, height, pixel_format, digest = self.entries[name]
+        if kind != KIND_IMAGE:
+            raise PackError(name + ' is not an image')
+        image = pygame.image.frombuffer(self.view[offset:offset + length], (width, height),
+                                        pixel_format.decode('ascii'))
+        image.set_alpha(None)
+        display = pygame.display.get_surface()
+        if display is not None and image.get_masks()[:3] != display.get_masks()[:3]:
+            image = image.convert()
+        if flags & FLAG_COLORKEY:
+            image.set_colorkey((0, 0, 0))
+        return image
+
+    def load_images(self, path):
+        # Same order as utils.load_images: the directory's files sorted by name
+        prefix = path.rstrip('/') + '/'
+        names = sorted(name for name in self.entries
+                       if name.startswith(prefix) and '/' not in name[len(prefix):])
+        return [self.load_image(name) for name in names]
@@ -1,25 +1,110 @@
-class Particle:
-    def __init__(self, game, p_type, pos, velocity=[0, 0], frame=0):
-        self.game = game
-        self.type = p_type
-        self.pos = list(pos)
-        self.velocity = list(velocity)
-        self.animation = self.game.assets['particle/' + p_type].copy()
-        self.animation.frame = frame
-    
+import numpy as np
+
+from src.utils import grow_arrays
+
+# Rows allocated up front; the arrays double whenever they fill up
+PARTICLE_CAPACITY = 256
+# Radians per animation frame of the horizontal sway of swaying particle types
+SWAY_RATE = 0.035
+
+
+class ParticleSystem:
+    # All particles of the game in parallel arrays, one row each: position, velocity,
+    # animation frame and type. Types are registered with their Animation, whose
+    # frames are unrolled into one table so that a row's image is looked up by index.
+    # A particle plays its animation once, is drawn one last time on the frame its
+    # animation is found finished and is dropped on the next update.
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        self.types = {}
+        self.frames = []
+        self.halves = np.zeros((0, 2))
+        self.sizes = np.zeros((0, 2))
+        self.base = np.zeros(0, dtype=int)
+        self.last = np.zeros(0, dtype=int)
+        self.sway = np.zeros(0)
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.frame = np.zeros(capacity, dtype=int)
+        self.kind = np.zeros(capacity, dtype=int)
+        self.done = np.zeros(capacity, dtype=bool)
+        self.spent = np.zeros(capacity, dtype=bool)
+        self.drawn = 0
+        self.culled = 0
+
+    def __len__(self):
+        return self.count
+
+    def register(self, p_type, animation, sway=0):
+        # Frame f of the animation shows images[int(f / img_duration)]
+        frames = [animation.images[int(f / animation.img_duration)]
+                  for f in range(animation.img_duration * len(animation.images))]
+        self.types[p_type] = len(self.base)
+        self.base = np.append(self.base, len(self.frames))
+        self.last = np.append(self.last, len(frames) - 1)
+        self.sway = np.append(self.sway, sway)
+        self.frames.extend(frames)
+        sizes = np.array([img.get_size() for img in frames], dtype=float).reshape(-1, 2)
+        self.sizes = np.concatenate([self.sizes, sizes])
+        self.halves = np.concatenate([self.halves, sizes // 2])
+
+    def reserve(self, count):
+        grow_arrays(self, ('pos', 'velocity', 'frame', 'kind', 'done', 'spent'), count, self.count)
+
+    def spawn(self, p_type, pos, velocity=(0, 0), frame=0):
+        self.spawn_batch(p_type, [pos], [velocity], [frame])
+
+    def spawn_batch(self, p_type, positions, velocities, frames):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        start = self.count
+        end = start + len(positions)
+        self.reserve(end)
+        self.pos[start:end] = positions
+        self.velocity[start:end] = np.asarray(velocities, dtype=float).reshape(-1, 2)
+        self.frame[start:end] = frames
+        self.kind[start:end] = self.types[p_type]
+        self.done[start:end] = False
+        self.spent[start:end] = False
+        self.count = end
+
+    def clear(self):
+        self.count = 0
+
     def update(self):
-        kill = False
-        if self.animation.is_done:
-            kill = True
-        
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
-        
-        self.animation.update()
-        
-        return kill
-    
+        # Rows found finished on the last update were drawn once more and now go
+        n = self.count
+        if self.spent[:n].any():
+            keep = np.nonzero(~self.spent[:n])[0]
+            n = len(keep)
+            for array in (self.pos, self.velocity, self.frame, self.kind, self.done):
+                array[:n] = array[keep]
+            self.count = n
+        kind = self.kind[:n]
+        last = self.last[kind]
+        self.spent[:n] = self.done[:n]
+        self.pos[:n] += self.velocity[:n]
+        self.frame[:n] = np.minimum(self.frame[:n] + 1, last)
+        self.done[:n] |= self.frame[:n] >= last
+        sway = self.sway[kind]
+        if sway.any():
+            self.pos[:n, 0] += np.sin(self.frame[:n] * SWAY_RATE) * sway
+
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
-        surf.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2))
-    
\ No newline at end of file
+        n = self.count
+        if not n:
+            self.drawn = 0
+            self.culled = 0
+            return
+        index = self.base[self.kind[:n]] + self.frame[:n]
+        dest = self.pos[:n] - offset - self.halves[index]
+        size = self.sizes[index]
+        visible = ((dest[:, 0] < surf.get_width()) & (dest[:, 0] + size[:, 0] > 0) &
+                   (dest[:, 1] < surf.get_height()) & (dest[:, 1] + size[:, 1] > 0))
+        frames = self.frames
+        self.drawn = int(visible.sum())
+        self.culled = n - self.drawn
+        surf.blits([(frames[i], (x, y)) for i, (x, y) in zip(index[visible].tolist(), dest[visible].tolist())],
+                   doreturn=False)
+
+    def stats(self):
+        return {'particles': self.count, 'drawn': self.drawn, 'culled': self.culled, 'capacity': len(self.pos)}
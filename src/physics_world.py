@@ -0,0 +1,90 @@
+import numpy as np
+
+# Columns of the per-frame body table
+BODY_COLUMNS = 8
+POS_X, POS_Y, VEL_X, VEL_Y, WIDTH, HEIGHT, MOVE_X, MOVE_Y = range(BODY_COLUMNS)
+MAX_FALL_SPEED = 5
+FALL_ACCELERATION = 0.1
+
+
+class PhysicsWorld:
+    # Batched stand-in for PhysicsEntity.move. Bodies submit their frame movement from
+    # their own update, then step resolves all of them against the tile grid at once
+    # and writes positions, velocities and collision flags back.
+    def __init__(self):
+        self.bodies = []
+        self.rows = []
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def submit(self, entity, frame_movement):
+        self.bodies.append(entity)
+        self.rows.append((entity.pos[0], entity.pos[1], entity.velocity[0], entity.velocity[1],
+                          entity.size[0], entity.size[1], frame_movement[0], frame_movement[1]))
+
+    def sweep_axis(self, tilemap, table, axis, delta):
+        # Per body, moves the integer rect by delta along one axis and stops it flush
+        # against the first solid cell ahead, as collision.sweep_aabb does
+        size = tilemap.tile_size
+        other = 1 - axis
+        start = np.trunc(table[:, axis])
+        extent = table[:, WIDTH + axis]
+        target = table[:, axis] + delta
+        hit = np.zeros(len(table), dtype=bool)
+        moving = np.nonzero(delta)[0]
+        if not len(moving):
+            return target, hit
+        forward = delta[moving] > 0
+        # Boxes covering exactly the cells whose near face is reached within the move
+        reach = np.floor(np.abs(delta[moving])) + 1
+        boxes = np.zeros((len(moving), 4))
+        boxes[:, axis] = np.where(forward, start[moving] + extent[moving], start[moving] - reach)
+        boxes[:, 2 + axis] = reach
+        boxes[:, other] = np.trunc(table[moving, other])
+        boxes[:, 2 + other] = table[moving, WIDTH + other]
+        index, cell_x, cell_y = tilemap.solid_cells(boxes)
+        cell = cell_x if axis == 0 else cell_y
+        body = moving[index]
+        ahead = forward[index]
+        near = np.where(ahead, cell * size, (cell + 1) * size)
+        # Cells the rect already overlaps are not hits, like sweep_aabb
+        valid = np.where(ahead, near >= start[body] + extent[body], near <= start[body])
+        body, ahead, near = body[valid], ahead[valid], near[valid]
+        contact = np.where(ahead, near - extent[body], near)
+        stop_forward = np.full(len(table), np.inf)
+        stop_back = np.full(len(table), -np.inf)
+        np.minimum.at(stop_forward, body[ahead], contact[ahead])
+        np.maximum.at(stop_back, body[~ahead], contact[~ahead])
+        hit = np.isfinite(stop_forward) | np.isfinite(stop_back)
+        target = np.where(np.isfinite(stop_forward), stop_forward, target)
+        target = np.where(np.isfinite(stop_back), stop_back, target)
+        return target, hit
+
+    def step(self, game, tilemap):
+        if not self.bodies:
+            return
+        table = np.array(self.rows, dtype=float).reshape(-1, BODY_COLUMNS)
+        dx = table[:, MOVE_X] * 2
+        dy = table[:, MOVE_Y]
+        hit_x = hit_y = np.zeros(len(table), dtype=bool)
+        if not game.initializing or game.direction == 'u':
+            table[:, POS_X], hit_x = self.sweep_axis(tilemap, table, 0, dx)
+            table[:, POS_Y], hit_y = self.sweep_axis(tilemap, table, 1, dy)
+        else:
+            table[:, POS_X] += dx
+        right = hit_x & (dx > 0)
+        left = hit_x & (dx < 0)
+        down = hit_y & (dy > 0)
+        up = hit_y & (dy < 0)
+        table[:, VEL_Y] = np.minimum(MAX_FALL_SPEED, table[:, VEL_Y] + FALL_ACCELERATION)
+        table[down | up, VEL_Y] = 0
+
+        for entity, row, flags in zip(self.bodies, table.tolist(),
+                                      np.stack([up, down, right, left], axis=1).tolist()):
+            entity.pos[0] = row[POS_X]
+            entity.pos[1] = row[POS_Y]
+            entity.velocity[1] = row[VEL_Y]
+            entity.collisions = {'up': flags[0], 'down': flags[1], 'right': flags[2], 'left': flags[3]}
+        self.bodies = []
+        self.rows = []
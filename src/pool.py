@@ -0,0 +1,29 @@
+class Pool:
+    # Free list of reusable instances of cls. acquire() takes the constructor's
+    # arguments and resets a released instance in place through its reset(), only
+    # building a new one when none is free. Released instances must not be used again.
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+        self.in_use = 0
+        self.high_water = 0
+        self.created = 0
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            item = self.free.pop()
+            item.reset(*args, **kwargs)
+        else:
+            item = self.cls(*args, **kwargs)
+            self.created += 1
+        self.in_use += 1
+        self.high_water = max(self.high_water, self.in_use)
+        return item
+
+    def release(self, item):
+        self.in_use -= 1
+        self.free.append(item)
+
+    def stats(self):
+        return {'in_use': self.in_use, 'free': len(self.free), 'high_water': self.high_water,
+                'created': self.created}
@@ -1,50 +1,72 @@
-import pygame
 import random
 import math
 
 from src.utils import PROJECTILE_STR, TYPE_ENEMY_STR, TYPE_PLAYER_STR, DISPLAY_WIDTH, JSON_MAP_WIDTH_STR, TILE_SIZE
-from src.spark import Spark
+from src.collision import raycast, ray_rect
 
 
 class Projectile:
     def __init__(self, pos, type, speed, game, flip):
-        self.pos = list(pos)
+        self.pos = [0, 0]
+        self.reset(pos, type, speed, game, flip)
+
+    def reset(self, pos, type, speed, game, flip):
+        self.pos[0] = pos[0]
+        self.pos[1] = pos[1]
         self.speed = speed
         self.type = type
         self.game = game
         self.flip = flip
 
     def update(self, tilemap):
-        if self.flip:
-            self.pos[0] += self.speed
-        else:
-            self.pos[0] -= self.speed
+        # The whole step is cast against walls and targets, so no speed can skip past them
+        delta = (self.speed if self.flip else -self.speed, 0)
+        wall = raycast(tilemap, self.pos, delta)
+        reach = wall.t if wall is not None else 1
+        target = None
+        broadphase = self.game.broadphase
+        area = broadphase.segment_rect(self.pos, delta)
+        if self.type == TYPE_PLAYER_STR:
+            for enemy in broadphase.enemies_in_rect(area):
+                t = ray_rect(self.pos, delta, enemy.rect())
+                if t is not None and t <= reach:
+                    reach = t
+                    target = enemy
+        elif self.type == TYPE_ENEMY_STR and abs(self.game.player.dashing) < 50 and broadphase.player_in_rect(area):
+            t = ray_rect(self.pos, delta, self.game.player.rect())
+            if t is not None and t <= reach:
+                reach = t
+                target = self.game.player
+        self.pos[0] += delta[0] * reach
+        self.pos[1] += delta[1] * reach
 
-        for enemy in self.game.enemies.copy():
-            if enemy.rect().collidepoint(self.pos) and self.type == TYPE_PLAYER_STR:
-                self.game.enemies.remove(enemy)
-                self.game.screen_shake = max(16, self.game.screen_shake)
-                for i in range(15):
-                    angle = random.random() * math.pi * 2
-                    self.game.sparks.append(
-                        Spark(enemy.rect().center, angle, 2 + random.random(), (135, 23, 45)))
-                return 0
-        if tilemap.solid_check(self.pos):
+        if target is self.game.player:
+            self.game.dead += 1
+            self.game.screen_shake = max(16, self.game.screen_shake)
+            for i in range(30):
+                angle = random.random() * math.pi * 2
+                self.game.sparks.spawn(self.game.player.rect(
+                ).center, angle, 2 + random.random(), (135, 23, 45))
+            return 0
+        if target is not None:
+            self.game.enemies.remove(target)
+            self.game.broadphase.remove(target)
+            self.game.screen_shake = max(16, self.game.screen_shake)
+            for i in range(15):
+                angle = random.random() * math.pi * 2
+                self.game.sparks.spawn(target.rect().center, angle, 2 + random.random(), (135, 23, 45))
+            return 0
+        if wall is not None:
+            # Sparks fly back out of the face that was hit
+            if wall.normal == (0, 0):
+                angle = math.pi if self.flip else 0
+            else:
+                angle = math.atan2(wall.normal[1], wall.normal[0])
             for i in range(4):
-                self.game.sparks.append(Spark(self.pos, random.random(
-                ) - 0.5 + (math.pi if self.flip > 0 else 0), 2 + random.random()))
+                self.game.sparks.spawn(self.pos, random.random() - 0.5 + angle, 2 + random.random())
             return 0
         elif self.pos[0] > max(tilemap.map_dims[JSON_MAP_WIDTH_STR] + TILE_SIZE + 6, DISPLAY_WIDTH + 6) or self.pos[0] < 0:
             return 0
-        elif abs(self.game.player.dashing) < 50:
-            if self.game.player.rect().collidepoint(self.pos) and self.type == TYPE_ENEMY_STR:
-                self.game.dead += 1
-                self.game.screen_shake = max(16, self.game.screen_shake)
-                for i in range(30):
-                    angle = random.random() * math.pi * 2
-                    self.game.sparks.append(Spark(self.game.player.rect(
-                    ).center, angle, 2 + random.random(), (135, 23, 45)))
-                return 0
         return 1
 
     def render(self, surf, offset=(0, 0)):
@@ -4,6 +4,8 @@ import random
 from src.utils import DISPLAY_WIDTH, DISPLAY_HEIGHT, JSON_MAP_WIDTH_STR, JSON_MAP_HEIGHT_STR
 import pygame
 
+from src.entity_list import EntityList
+
 class RainDrop:
     def __init__(self, pos, color=(200,200,200)):
         self.pos = list(pos)
@@ -27,12 +29,6 @@ class RainDrop:
                 
         if self.pos[1] >= max(tilemap.map_dims[JSON_MAP_HEIGHT_STR], DISPLAY_HEIGHT) or self.pos[0] >= max(tilemap.map_dims[JSON_MAP_WIDTH_STR], DISPLAY_WIDTH):
             self.reset_pos()
-        for rect in tilemap.nearby_tiles_rects(self.pos):
-            if self.rect().colliderect(rect):
-                # self.reset_pos()
-                return True
-    
-        return False
     
     def render(self, surf, offset=(0, 0)):
         # Create a semi-transparent surface for raindrops
@@ -45,21 +41,27 @@ class RainDrop:
 class Rain:
     def __init__(self, count = 30):
         self.raindrops = []
-        self.splashes = []
+        self.splashes = EntityList()
         
         for i in range(count):
             self.raindrops.append(RainDrop((random.randint(0, DISPLAY_WIDTH), random.randint(-150, -10))))        
     
     def update(self, tilemap):
-        for i in range(len(self.raindrops)):
-            if self.raindrops[i].update(tilemap):
-                self.splashes.append(Splash(self.raindrops[i].pos))
-                self.raindrops[i].reset_pos()
+        for raindrop in self.raindrops:
+            raindrop.update(tilemap)
+
+        # One batched solidity query for every drop instead of a tile scan per drop
+        hits = tilemap.solid_overlaps([(raindrop.pos[0], raindrop.pos[1], 1, 1)
+                                       for raindrop in self.raindrops])
+        for i in hits.nonzero()[0]:
+            self.splashes.append(Splash(self.raindrops[i].pos))
+            self.raindrops[i].reset_pos()
 
         for splash in self.splashes:
             splash.update()
             if not splash.particles:
-                self.splashes.remove(splash)
+                self.splashes.kill(splash)
+        self.splashes.compact()
                 
     def render(self, surf, offset=(0, 0)):
         for raindrop in self.raindrops:
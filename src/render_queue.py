@@ -0,0 +1,94 @@
+LAYER_ENEMIES = 'enemies'
+LAYER_PLAYER = 'player'
+LAYER_PROJECTILES = 'projectiles'
+LAYER_SPARKS = 'sparks'
+LAYER_THROWABLES = 'throwables'
+LAYER_EXPLOSIONS = 'explosions'
+LAYER_PARTICLES = 'particles'
+
+# Submission order, back to front
+RENDER_LAYERS = (LAYER_ENEMIES, LAYER_PLAYER, LAYER_PROJECTILES, LAYER_SPARKS,
+                 LAYER_THROWABLES, LAYER_EXPLOSIONS, LAYER_PARTICLES)
+
+
+class RenderLayer:
+    # Stands in for the target Surface in the render(surf, offset) methods: blits
+    # are culled against the viewport and collected for a single Surface.blits call.
+    def __init__(self, queue):
+        self.queue = queue
+        self.blit_sequence = []
+        self.deferred = []
+
+    def get_width(self):
+        return self.queue.camera.width
+
+    def get_height(self):
+        return self.queue.camera.height
+
+    def get_size(self):
+        return self.queue.camera.size
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        # dest is in screen space, callers have already subtracted the camera offset
+        if area is None:
+            width, height = source.get_size()
+        else:
+            width, height = area[2], area[3]
+        if (dest[0] >= self.queue.camera.width or dest[0] + width <= 0 or
+                dest[1] >= self.queue.camera.height or dest[1] + height <= 0):
+            self.queue.culled += 1
+            return
+        if area is None and not special_flags:
+            self.blit_sequence.append((source, dest))
+        else:
+            self.blit_sequence.append((source, dest, area, special_flags))
+
+    def blits(self, blit_sequence, doreturn=False):
+        # For callers that have already culled their (source, dest) pairs against the view;
+        # they add what they left out to queue.culled themselves
+        self.blit_sequence.extend(blit_sequence)
+
+    def defer(self, rect, render, *args):
+        # For draws that are not blits: rect is the world-space bounds, and
+        # render(surface, *args) is called at flush time if it is on screen
+        if not self.queue.camera.colliderect(rect):
+            self.queue.culled += 1
+            return
+        self.deferred.append((render, args))
+
+    def clear(self):
+        self.blit_sequence.clear()
+        self.deferred.clear()
+
+
+class RenderQueue:
+    def __init__(self, layers=RENDER_LAYERS):
+        self.layers = {name: RenderLayer(self) for name in layers}
+        self.order = list(layers)
+        self.camera = None
+        self.submitted = 0
+        self.culled = 0
+
+    def begin(self, camera_rect):
+        self.camera = camera_rect
+        self.submitted = 0
+        self.culled = 0
+        for layer in self.layers.values():
+            layer.clear()
+
+    def layer(self, name):
+        return self.layers[name]
+
+    def flush(self, surf):
+        for name in self.order:
+            layer = self.layers[name]
+            if layer.blit_sequence:
+                surf.blits(layer.blit_sequence, doreturn=False)
+                self.submitted += len(layer.blit_sequence)
+            for render, args in layer.deferred:
+                render(surf, *args)
+            self.submitted += len(layer.deferred)
+            layer.clear()
+
+    def stats(self):
+        return {'submitted': self.submitted, 'culled': self.culled}
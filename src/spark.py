@@ -1,26 +1,112 @@
 import math
 
+import numpy as np
 import pygame
 
-class Spark:
-    def __init__(self, pos, angle, speed, colors=(255, 162, 0)):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
-        self.colors = list(colors)
-        
+from src.utils import grow_arrays
+
+SPARK_COLOR = (255, 162, 0)
+# Rows allocated up front; the arrays double whenever they fill up
+SPARK_CAPACITY = 256
+# Sprites are cached per angle bucket, length step of speed and colour
+SPARK_ANGLE_BUCKETS = 32
+SPARK_LENGTH_STEP = 0.25
+
+
+class SparkSystem:
+    # All sparks in parallel arrays: position, unit direction, speed and colour. A
+    # spark flies along its direction, slowing by 0.1 a frame, and is gone once it
+    # stops. It is drawn as a diamond 6 * speed long and speed wide, taken from
+    # a cache of pre-rasterised sprites, with all sparks submitted in one blits call.
+    def __init__(self, capacity=SPARK_CAPACITY):
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.direction = np.zeros((capacity, 2))
+        self.speed = np.zeros(capacity)
+        self.color = np.zeros(capacity, dtype=int)
+        self.colors = []
+        self.color_index = {}
+        self.sprites = {}
+        self.drawn = 0
+        self.culled = 0
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, count):
+        grow_arrays(self, ('pos', 'direction', 'speed', 'color'), count, self.count)
+
+    def spawn(self, pos, angle, speed, colors=SPARK_COLOR):
+        self.spawn_batch([pos], [angle], [speed], colors)
+
+    def spawn_batch(self, positions, angles, speeds, colors=SPARK_COLOR):
+        angles = np.asarray(angles, dtype=float)
+        start = self.count
+        end = start + len(angles)
+        self.reserve(end)
+        colors = tuple(colors)
+        if colors not in self.color_index:
+            self.color_index[colors] = len(self.colors)
+            self.colors.append(colors)
+        self.pos[start:end] = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.direction[start:end, 0] = np.cos(angles)
+        self.direction[start:end, 1] = np.sin(angles)
+        self.speed[start:end] = speeds
+        self.color[start:end] = self.color_index[colors]
+        self.count = end
+
+    def clear(self):
+        self.count = 0
+
     def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
-    
+        n = self.count
+        self.pos[:n] += self.direction[:n] * self.speed[:n, None]
+        self.speed[:n] = np.maximum(0, self.speed[:n] - 0.1)
+        moving = self.speed[:n] > 0
+        if not moving.all():
+            keep = np.nonzero(moving)[0]
+            n = len(keep)
+            for array in (self.pos, self.direction, self.speed, self.color):
+                array[:n] = array[keep]
+            self.count = n
+
+    def sprite(self, key):
+        # Diamond of the bucket's centre angle and length, centred on its surface
+        angle_bucket, length_bucket, color = key
+        angle = angle_bucket * math.pi * 2 / SPARK_ANGLE_BUCKETS
+        speed = length_bucket * SPARK_LENGTH_STEP
+        size = int(math.ceil(speed * 6)) + 3
+        center = size / 2
+        points = [(center + math.cos(angle + turn) * speed * reach, center + math.sin(angle + turn) * speed * reach)
+                  for turn, reach in ((0, 3), (math.pi * 0.5, 0.5), (math.pi, 3), (-math.pi * 0.5, 0.5))]
+        surf = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.polygon(surf, self.colors[color], points)
+        sprite = (surf, center)
+        self.sprites[key] = sprite
+        return sprite
+
     def render(self, surf, offset=(0, 0)):
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-        ]
-        
-        pygame.draw.polygon(surf, self.colors, render_points)
\ No newline at end of file
+        n = self.count
+        self.drawn = 0
+        self.culled = 0
+        if not n:
+            return
+        reach = self.speed[:n] * 3
+        pos = self.pos[:n] - offset
+        visible = ((pos[:, 0] - reach < surf.get_width()) & (pos[:, 0] + reach + 1 > 0) &
+                   (pos[:, 1] - reach < surf.get_height()) & (pos[:, 1] + reach + 1 > 0))
+        angle = np.arctan2(self.direction[:n, 1], self.direction[:n, 0])
+        angle_bucket = np.round(angle * SPARK_ANGLE_BUCKETS / (math.pi * 2)).astype(int) % SPARK_ANGLE_BUCKETS
+        length_bucket = np.maximum(np.round(self.speed[:n] / SPARK_LENGTH_STEP).astype(int), 1)
+        sprites = self.sprites
+        blit_sequence = []
+        for key, (x, y) in zip(zip(angle_bucket[visible].tolist(), length_bucket[visible].tolist(),
+                                   self.color[:n][visible].tolist()), pos[visible].tolist()):
+            sprite = sprites.get(key) or self.sprite(key)
+            blit_sequence.append((sprite[0], (x - sprite[1], y - sprite[1])))
+        self.drawn = len(blit_sequence)
+        self.culled = n - self.drawn
+        surf.blits(blit_sequence, doreturn=False)
+
+    def stats(self):
+        return {'sparks': self.count, 'drawn': self.drawn, 'culled': self.culled, 'sprites': len(self.sprites)}
@@ -0,0 +1,87 @@
+import pygame
+
+
+class SpatialGrid:
+    # Uniform grid of buckets; every item is stored in each bucket its rect touches.
+    # Iteration and query results keep insertion order.
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.entries = {}
+        self.next_order = 0
+
+    def __iter__(self):
+        return iter([entry[1] for entry in self.entries.values()])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, item):
+        return id(item) in self.entries
+
+    def cells(self, rect):
+        for cx in range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1):
+            for cy in range(rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size + 1):
+                yield (cx, cy)
+
+    def insert(self, item, rect):
+        # Items are keyed by identity, so unhashable ones such as tile dicts work too
+        entry = (self.next_order, item, pygame.Rect(rect))
+        self.next_order += 1
+        self.entries[id(item)] = entry
+        for cell in self.cells(entry[2]):
+            self.buckets.setdefault(cell, []).append(entry)
+
+    def remove(self, item):
+        entry = self.entries.pop(id(item))
+        for cell in self.cells(entry[2]):
+            bucket = self.buckets[cell]
+            bucket.remove(entry)
+            if not bucket:
+                del self.buckets[cell]
+
+    def move(self, item, rect):
+        # Same as remove and insert, but the item keeps its place in the order
+        old = self.entries[id(item)]
+        for cell in self.cells(old[2]):
+            bucket = self.buckets[cell]
+            bucket.remove(old)
+            if not bucket:
+                del self.buckets[cell]
+        entry = (old[0], item, pygame.Rect(rect))
+        self.entries[id(item)] = entry
+        for cell in self.cells(entry[2]):
+            self.buckets.setdefault(cell, []).append(entry)
+
+    def rect(self, item):
+        return self.entries[id(item)][2]
+
+    def clear(self):
+        self.buckets = {}
+        self.entries = {}
+
+    def query_rect(self, rect):
+        rect = pygame.Rect(rect)
+        found = {}
+        for cell in self.cells(rect):
+            for entry in self.buckets.get(cell, ()):
+                if entry[0] not in found and entry[2].colliderect(rect):
+                    found[entry[0]] = entry[1]
+        return [found[order] for order in sorted(found)]
+
+    def query_point(self, pos):
+        cell = (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+        return [entry[1] for entry in self.buckets.get(cell, ()) if entry[2].collidepoint(pos)]
+
+    def query_radius(self, center, radius):
+        # Items whose rect comes within radius of center
+        found = {}
+        for cell in self.cells(pygame.Rect(int(center[0] - radius), int(center[1] - radius),
+                                           int(radius * 2) + 2, int(radius * 2) + 2)):
+            for entry in self.buckets.get(cell, ()):
+                rect = entry[2]
+                dx = max(rect.left - center[0], 0, center[0] - rect.right)
+                dy = max(rect.top - center[1], 0, center[1] - rect.bottom)
+                if entry[0] not in found and dx * dx + dy * dy <= radius * radius:
+                    found[entry[0]] = entry[1]
+        return [found[order] for order in sorted(found)]
@@ -0,0 +1,71 @@
+import pygame
+
+from src.entities import FloatingEnemy
+from src.spatial_grid import SpatialGrid
+from src.utils import JSON_POS_STR, PLAYER_SIZE_X, PLAYER_SIZE_Y
+
+# Distance, in pixels, past the camera edges at which enemies are woken up
+ACTIVATION_MARGIN = 64
+# Bucket size, in pixels, of the zone index
+ZONE_BUCKET_SIZE = 128
+
+
+class SpawnZone:
+    def __init__(self, pos):
+        self.pos = list(pos)
+        self.record = None
+        self.enemy = None
+
+    def rect(self):
+        return pygame.Rect(self.pos[0], self.pos[1], PLAYER_SIZE_X, PLAYER_SIZE_Y)
+
+
+class SpawnZones:
+    # Spawners as activation zones: an enemy only exists while its zone is near the
+    # camera, and is parked back into its zone's record once the zone is left behind
+    def __init__(self, game, spawners, margin=ACTIVATION_MARGIN):
+        self.game = game
+        self.margin = margin
+        self.zones = SpatialGrid(ZONE_BUCKET_SIZE)
+        self.active = []
+        for spawner in spawners:
+            zone = SpawnZone(spawner[JSON_POS_STR])
+            self.zones.insert(zone, zone.rect())
+
+    def update(self, camera_rect):
+        area = camera_rect.inflate(self.margin * 2, self.margin * 2)
+        alive = {id(enemy) for enemy in self.game.enemies}
+        still_active = []
+        for zone in self.active:
+            if id(zone.enemy) not in alive:
+                # Killed while active, the spawner is used up
+                self.zones.remove(zone)
+            elif not area.colliderect(zone.enemy.rect()):
+                self.park(zone)
+            else:
+                still_active.append(zone)
+        self.active = still_active
+        for zone in self.zones.query_rect(area):
+            if zone.enemy is None:
+                self.wake(zone)
+
+    def wake(self, zone):
+        zone.enemy = FloatingEnemy(self.game, zone.pos, (PLAYER_SIZE_X, PLAYER_SIZE_Y))
+        zone.enemy.world = self.game.physics_world
+        zone.enemy.navigation = self.game.navigation
+        if zone.record is not None:
+            zone.enemy.unpark(zone.record)
+        self.game.enemies.append(zone.enemy)
+        self.active.append(zone)
+
+    def park(self, zone):
+        zone.record = zone.enemy.park()
+        self.game.enemies.remove(zone.enemy)
+        zone.enemy = None
+        # The zone follows the enemy, so it wakes where it was left
+        self.zones.remove(zone)
+        zone.pos = [zone.record[0], zone.record[1]]
+        self.zones.insert(zone, zone.rect())
+
+    def stats(self):
+        return {'active': len(self.active), 'dormant': len(self.zones) - len(self.active)}
@@ -0,0 +1,230 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from src.map_format import map_buffer, decode_map, decode_streaming_header
+from src.spatial_grid import SpatialGrid
+from src.tilemap import Tilemap, CHUNK_SIZE, OFFGRID_BUCKET_SIZE
+from src.utils import (JSON_TYPE_STR, JSON_VARIANT_STR, JSON_POS_STR, TILE_SIZE, JSON_TILEMAP_STR,
+                       JSON_TILE_SIZE_STR, JSON_OFFGRID_STR, JSON_MAP_DIMS_STR, JSON_LVL_STR)
+
+# Most map chunks kept decoded at once; the ones around the camera are never evicted
+STREAM_CHUNK_BUDGET = 64
+# Map chunks loaded past each edge of the camera
+STREAM_MARGIN = 1
+
+
+class StreamingTilemap(Tilemap):
+    # Tilemap over a streaming map file. Map chunks are decoded when the camera or a
+    # query reaches them, and the least recently used ones are dropped past the budget.
+    def __init__(self, game, tile_size=16, budget=STREAM_CHUNK_BUDGET, margin=STREAM_MARGIN):
+        super().__init__(game, tile_size)
+        self.budget = budget
+        self.margin = margin
+        self.source = None
+        self.chunk_size = CHUNK_SIZE
+        self.chunk_index = {}
+        self.loaded = OrderedDict()
+        self.solid_chunks = {}
+        self.excluded = set()
+        self.pinned = set()
+        self.held = set()
+        self.chunk_pairs = None
+
+    def load(self, path, pack=None):
+        self.source = map_buffer(path, pack)
+        self.chunk_size, meta, self.chunk_index = decode_streaming_header(self.source)
+        self.tile_size = meta[JSON_TILE_SIZE_STR]
+        self.map_dims = meta[JSON_MAP_DIMS_STR]
+        self.lvl = meta[JSON_LVL_STR]
+        self.tilemap = {}
+        self.tile_index = {}
+        self.offgrid_tiles = SpatialGrid(OFFGRID_BUCKET_SIZE)
+        self.offgrid_index = {}
+        self.solid_rects = {}
+        self.solid_chunks = {}
+        self.chunks = {}
+        self.loaded = OrderedDict()
+        self.pinned = set()
+        self.held = set()
+        self.chunk_pairs = None
+
+    def read_chunk(self, chunk):
+        offset, length = self.chunk_index[chunk]
+        return decode_map(self.source[offset:offset + length])
+
+    def ensure_chunk(self, chunk):
+        # Loading and dropping chunks does not change the map, so it keeps version as is
+        if chunk in self.loaded:
+            self.loaded.move_to_end(chunk)
+            return
+        if chunk not in self.chunk_index:
+            return
+        version = self.version
+        self.trim(self.budget - 1)
+        chunk_data = self.read_chunk(chunk)
+        locs = []
+        offgrid = []
+        for loc, tile in chunk_data[JSON_TILEMAP_STR].items():
+            if (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) not in self.excluded:
+                self.tilemap[loc] = tile
+                self.index_tile(loc, tile)
+                self.update_solid(loc)
+                self.invalidate_chunk(loc)
+                locs.append(loc)
+        for tile in chunk_data[JSON_OFFGRID_STR]:
+            if (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) not in self.excluded:
+                self.add_offgrid(tile)
+                offgrid.append(tile)
+        self.loaded[chunk] = (locs, offgrid)
+        self.version = version
+
+    def trim(self, budget):
+        # Drops the least recently used chunks until budget are left, except the ones
+        # around the camera and the ones the query in progress is reading
+        for chunk in list(self.loaded):
+            if len(self.loaded) <= budget:
+                break
+            if chunk not in self.pinned and chunk not in self.held:
+                self.evict_chunk(chunk)
+
+    def evict_chunk(self, chunk):
+        version = self.version
+        locs, offgrid = self.loaded.pop(chunk)
+        for loc in locs:
+            self.remove_tile(loc)
+        for tile in offgrid:
+            if tile in self.offgrid_tiles:
+                self.remove_offgrid(tile)
+        self.solid_chunks.pop(chunk, None)
+        self.version = version
+
+    def ensure_cells(self, min_x, min_y, max_x, max_y):
+        # Loads every map chunk holding a cell in [min, max), and holds them until the
+        # next query
+        self.held = set()
+        for cx in range(min_x // self.chunk_size, (max_x - 1) // self.chunk_size + 1):
+            for cy in range(min_y // self.chunk_size, (max_y - 1) // self.chunk_size + 1):
+                self.held.add((cx, cy))
+                self.ensure_chunk((cx, cy))
+
+    def ensure_around(self, pos):
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        self.ensure_cells(tile_loc[0] - 1, tile_loc[1] - 1, tile_loc[0] + 2, tile_loc[1] + 2)
+
+    def stream(self, camera_rect):
+        chunk_px = self.chunk_size * self.tile_size
+        self.pinned = set()
+        self.held = set()
+        for cx in range(camera_rect.left // chunk_px - self.margin,
+                        (camera_rect.right - 1) // chunk_px + self.margin + 1):
+            for cy in range(camera_rect.top // chunk_px - self.margin,
+                            (camera_rect.bottom - 1) // chunk_px + self.margin + 1):
+                self.pinned.add((cx, cy))
+        for chunk in self.pinned:
+            self.ensure_chunk(chunk)
+        self.trim(self.budget)
+
+    def extract(self, id_pairs, keep=False):
+        # Loaded chunks are served by the indexes, the others are decoded just for the scan.
+        # The first scan records which pairs each chunk holds, so later ones only decode
+        # the chunks with a match. Without keep, the extracted pairs are also left out of
+        # chunks loaded later.
+        id_pairs = list(dict.fromkeys(id_pairs))
+        matches = super().extract(id_pairs, keep)
+        # Pairs already extracted for good are gone from the map
+        wanted = set(id_pairs) - self.excluded
+        first = self.chunk_pairs is None
+        if first:
+            self.chunk_pairs = {}
+        for chunk in self.chunk_index:
+            if not first and (chunk in self.loaded or not self.chunk_pairs[chunk] & wanted):
+                continue
+            chunk_data = self.read_chunk(chunk)
+            if first:
+                self.chunk_pairs[chunk] = {(tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR])
+                                           for tile in chunk_data[JSON_OFFGRID_STR] +
+                                           list(chunk_data[JSON_TILEMAP_STR].values())}
+                if chunk in self.loaded:
+                    continue
+            for tile in chunk_data[JSON_OFFGRID_STR]:
+                if (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) in wanted:
+                    matches.append(tile)
+            for tile in chunk_data[JSON_TILEMAP_STR].values():
+                if (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) in wanted:
+                    tile[JSON_POS_STR] = [tile[JSON_POS_STR][0] * TILE_SIZE, tile[JSON_POS_STR][1] * TILE_SIZE]
+                    matches.append(tile)
+        if not keep:
+            self.excluded.update(id_pairs)
+        return matches
+
+    def set_solid_cell(self, loc, solid):
+        chunk = (loc[0] // self.chunk_size, loc[1] // self.chunk_size)
+        grid = self.solid_chunks.get(chunk)
+        if grid is None:
+            if not solid:
+                return
+            grid = self.solid_chunks[chunk] = np.zeros((self.chunk_size, self.chunk_size), dtype=bool)
+        grid[loc[0] - chunk[0] * self.chunk_size, loc[1] - chunk[1] * self.chunk_size] = solid
+
+    def solid_region(self, min_x, min_y, max_x, max_y):
+        region = np.zeros((max_x - min_x, max_y - min_y), dtype=bool)
+        size = self.chunk_size
+        self.held = set()
+        for cx in range(min_x // size, (max_x - 1) // size + 1):
+            for cy in range(min_y // size, (max_y - 1) // size + 1):
+                self.held.add((cx, cy))
+                self.ensure_chunk((cx, cy))
+                grid = self.solid_chunks.get((cx, cy))
+                if grid is None:
+                    continue
+                x0, x1 = max(min_x, cx * size), min(max_x, (cx + 1) * size)
+                y0, y1 = max(min_y, cy * size), min(max_y, (cy + 1) * size)
+                region[x0 - min_x:x1 - min_x, y0 - min_y:y1 - min_y] = \
+                    grid[x0 - cx * size:x1 - cx * size, y0 - cy * size:y1 - cy * size]
+        return region, (min_x, min_y)
+
+    def solid_cells(self, boxes):
+        # One region per map chunk the boxes start in, instead of one around all of them
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        span = self.chunk_size * self.tile_size
+        chunk_x = np.floor(np.trunc(boxes[:, 0]) / span).astype(int)
+        chunk_y = np.floor(np.trunc(boxes[:, 1]) / span).astype(int)
+        found = [[], [], []]
+        for chunk in sorted(set(zip(chunk_x.tolist(), chunk_y.tolist()))):
+            rows = np.nonzero((chunk_x == chunk[0]) & (chunk_y == chunk[1]))[0]
+            index, cell_x, cell_y = super().solid_cells(boxes[rows])
+            found[0].append(rows[index])
+            found[1].append(cell_x)
+            found[2].append(cell_y)
+        if not found[0]:
+            empty = np.zeros(0, dtype=int)
+            return empty, empty, empty
+        return tuple(np.concatenate(part) for part in found)
+
+    def solid_cell(self, loc):
+        self.ensure_chunk((loc[0] // self.chunk_size, loc[1] // self.chunk_size))
+        return loc in self.solid_rects
+
+    def solid_check(self, pos):
+        loc = (int(pos[0] // TILE_SIZE), int(pos[1] // TILE_SIZE))
+        self.ensure_chunk((loc[0] // self.chunk_size, loc[1] // self.chunk_size))
+        return super().solid_check(pos)
+
+    def nearby_tiles(self, pos):
+        self.ensure_around(pos)
+        return super().nearby_tiles(pos)
+
+    def nearby_tiles_rects(self, pos):
+        self.ensure_around(pos)
+        return super().nearby_tiles_rects(pos)
+
+    def render(self, surf, offset=(0, 0)):
+        # Decor is placed by its top left corner, so it can hang over from the chunk
+        # above or to the left of the view
+        chunk_px = self.chunk_size * self.tile_size
+        self.ensure_cells((offset[0] // chunk_px - 1) * self.chunk_size,
+                          (offset[1] // chunk_px - 1) * self.chunk_size,
+                          (offset[0] + surf.get_width()) // self.tile_size + 1,
+                          (offset[1] + surf.get_height()) // self.tile_size + 1)
+        super().render(surf, offset)
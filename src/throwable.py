@@ -2,6 +2,7 @@ import pygame
 
 from src.utils import (BOUNCE_FACTOR, THROWABLE_VELOCITY_X, JSON_MAP_HEIGHT_STR, JSON_MAP_WIDTH_STR,
                        THROWABLE_VELOCITY_Y, GRAVITY, DISPLAY_WIDTH, DISPLAY_HEIGHT, SIZE_8)
+from src.collision import sweep_aabb
 from src.explosion import Explosion
 
 
@@ -23,33 +24,29 @@ class Throwable:
                            self.size, self.size)
 
     def update(self, tilemap):
-        if self.flip:
-            self.pos[0] -= self.velocityX
-        else:
-            self.pos[0] += self.velocityX
-
-        self.pos[1] += self.velocityY
-
-        throwable_rect = self.rect()
-
-        for rect in tilemap.nearby_tiles_rects(self.pos):
-            if throwable_rect.colliderect(rect):
-                # Check collision side (top, bottom, left, or right)
-                collision_side = self.get_collision_side(throwable_rect, rect)
-
-                # Handle collision based on side
-                if collision_side == "top":
-                    self.pos[1] = rect.top - self.size
-                    self.velocityY *= -BOUNCE_FACTOR  # Bounce on ceiling
-                elif collision_side == "bottom":
-                    self.pos[1] = rect.bottom
-                    self.velocityY = 0  # Stop bouncing on ground
-                elif collision_side == "left":
-                    self.pos[0] = rect.left - throwable_rect.width
-                    self.velocityX *= -BOUNCE_FACTOR  # Bounce on left wall
-                elif collision_side == "right":
-                    self.pos[0] = rect.right
-                    self.velocityX *= -BOUNCE_FACTOR  # Bounce on right wall
+        delta = (-self.velocityX if self.flip else self.velocityX, self.velocityY)
+        # After a contact the rest of the move slides along the face that was hit
+        for i in range(2):
+            hit = sweep_aabb(tilemap, (self.pos[0], self.pos[1], self.size, self.size), delta)
+            if hit is None:
+                self.pos[0] += delta[0]
+                self.pos[1] += delta[1]
+                break
+            self.pos[0] += delta[0] * hit.t
+            self.pos[1] += delta[1] * hit.t
+            if hit.normal[0] != 0:
+                self.pos[0] = hit.cell[0] * tilemap.tile_size - self.size if hit.normal[0] < 0 \
+                    else (hit.cell[0] + 1) * tilemap.tile_size
+                self.velocityX *= -BOUNCE_FACTOR  # Bounce off walls
+                delta = (0, delta[1] * (1 - hit.t))
+            else:
+                self.pos[1] = hit.cell[1] * tilemap.tile_size - self.size if hit.normal[1] < 0 \
+                    else (hit.cell[1] + 1) * tilemap.tile_size
+                if hit.normal[1] < 0:
+                    self.velocityY *= -BOUNCE_FACTOR  # Bounce on the ground
+                else:
+                    self.velocityY = 0  # Stop at ceilings
+                delta = (delta[0] * (1 - hit.t), 0)
         if self.pos[0] + self.size >= max(tilemap.map_dims[JSON_MAP_WIDTH_STR] + SIZE_8, DISPLAY_WIDTH) or self.pos[1] + self.size >= max(tilemap.map_dims[JSON_MAP_HEIGHT_STR], DISPLAY_HEIGHT):
             return False
 
@@ -73,27 +70,6 @@ class Throwable:
                   (self.pos[0] - offset[0],
                    self.pos[1] - offset[1]))
 
-    def get_collision_side(self, throwable_rect, tile_rect):
-
-        throwable_x = throwable_rect.centerx
-        tile_x = tile_rect.centerx
-        throwable_y = throwable_rect.centery
-        tile_y = tile_rect.centery
-
-        dx = tile_x - throwable_x
-        dy = tile_y - throwable_y
-
-        if abs(dx) > abs(dy):
-            if dx > 0:
-                return "left"
-            else:
-                return "right"
-        else:
-            if dy > 0:
-                return "top"
-            else:
-                return "bottom"
-
 
 class Grenade(Throwable):
     def __init__(self, game, pos, timer, t_type, size=8, flip=False, frame=0):
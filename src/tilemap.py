@@ -1,7 +1,10 @@
-import json
+import numpy as np
 import pygame
 
-from src.utils import JSON_TYPE_STR, JSON_VARIANT_STR, JSON_POS_STR, TILE_SIZE, JSON_OFFGRID_STR
+from src.map_format import read_map, write_map
+from src.spatial_grid import SpatialGrid
+from src.utils import (JSON_TYPE_STR, JSON_VARIANT_STR, JSON_POS_STR, TILE_SIZE, JSON_OFFGRID_STR,
+                       JSON_MAP_WIDTH_STR, JSON_MAP_HEIGHT_STR)
 AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (0, 1)])): 0,
     tuple(sorted([(1, 0), (0, 1), (-1, 0)])): 1,
@@ -14,10 +17,18 @@ AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (-1, 0), (0, 1), (0, -1)])): 8,
 }
 
+# Already in sorted order, so the neighbour tuples built from it match AUTOTILE_MAP keys
+AUTOTILE_SHIFTS = [(-1, 0), (0, -1), (0, 1), (1, 0)]
 NEIGHBOR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1),
                     (1, 0), (0, 0), (-1, 1), (0, 1), (1, 1)]
 PHYSICS_TILES = {'grass', 'stone', 'dungeon'}
 AUTOTILE_TYPES = {'grass', 'stone', 'dungeon'}
+# Extra cells allocated around the solid grid when an edit falls outside it
+SOLID_GRID_PADDING = 16
+# Width and height, in tiles, of the pre-rendered chunks used by render
+CHUNK_SIZE = 16
+# Bucket size, in pixels, of the offgrid decor index
+OFFGRID_BUCKET_SIZE = 64
 
 
 class Tilemap:
@@ -25,10 +36,18 @@ class Tilemap:
         self.game = game
         self.tile_size = tile_size
         self.tilemap = {}
-        self.offgrid_tiles = []
+        self.offgrid_tiles = SpatialGrid(OFFGRID_BUCKET_SIZE)
         self.map_dims = []
         self.lvl = []
-        
+        self.solid_grid = np.zeros((0, 0), dtype=bool)
+        self.grid_origin = (0, 0)
+        self.solid_rects = {}
+        # Bumped whenever a cell changes solidity, so caches built on it can tell they are stale
+        self.version = 0
+        self.chunks = {}
+        self.tile_index = {}
+        self.offgrid_index = {}
+
     def rect(self, pos, dir):
         if dir != None:
             if dir == "l":
@@ -49,47 +68,244 @@ class Tilemap:
                            TILE_SIZE, TILE_SIZE * 3)
         
     def extract(self, id_pairs, keep=False):
+        # Served from the (type, variant) indexes, so the cost follows the number of matches
+        id_pairs = list(dict.fromkeys(id_pairs))
         matches = []
-        for tile in self.offgrid_tiles.copy():
-            if (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) in id_pairs:
+        for id_pair in id_pairs:
+            for tile in list(self.offgrid_index.get(id_pair, {}).values()):
                 matches.append(tile.copy())
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
+                    self.remove_offgrid(tile)
 
-        for loc in self.tilemap.copy():
-            tile = self.tilemap[loc]
-            if (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) in id_pairs:
+        for id_pair in id_pairs:
+            for loc, tile in list(self.tile_index.get(id_pair, {}).items()):
                 matches.append(tile.copy())
                 matches[-1][JSON_POS_STR] = matches[-1][JSON_POS_STR].copy()
                 matches[-1][JSON_POS_STR][0] *= TILE_SIZE
                 matches[-1][JSON_POS_STR][1] *= TILE_SIZE
                 if not keep:
-                    del self.tilemap[loc]
+                    self.remove_tile(loc)
         return matches
 
+    def index_tile(self, loc, tile):
+        self.tile_index.setdefault((tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]), {})[loc] = tile
+
+    def unindex_tile(self, loc, tile):
+        id_pair = (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR])
+        locs = self.tile_index[id_pair]
+        del locs[loc]
+        if not locs:
+            del self.tile_index[id_pair]
+
+    def map_data(self):
+        return {'tilemap': dict(self.tilemap), 'tile_size': self.tile_size,
+                'offgrid': list(self.offgrid_tiles), 'map_dims': self.map_dims, 'lvl': self.lvl}
+
     def save(self, path):
-        f = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size,
-                  'offgrid': self.offgrid_tiles, 'map_dims': self.map_dims}, f)
-        f.close()
+        # The runtime grid is keyed by (x, y) tuples; the JSON maps keep "x;y" strings.
+        # Paths ending in BINARY_MAP_EXT are written in the packed binary format instead.
+        map_data = self.map_data()
+        tilemap = {}
+        for loc in self.tilemap:
+            tilemap[str(loc[0]) + ';' + str(loc[1])] = self.tilemap[loc]
+        map_data['tilemap'] = tilemap
+        write_map(path, map_data)
 
-    def load(self, path):
-        f = open(path, 'r')
-        map_data = json.load(f)
-        f.close()
+    def load(self, path, pack=None):
+        self.load_data(read_map(path, pack))
 
-        self.tilemap = map_data['tilemap']
+    def load_data(self, map_data):
+        # Tiles are copied, so the same map data can be loaded into any number of tilemaps
+        self.tilemap = {}
+        self.tile_index = {}
+        for tile in map_data['tilemap'].values():
+            loc = (int(tile[JSON_POS_STR][0]), int(tile[JSON_POS_STR][1]))
+            self.tilemap[loc] = {JSON_TYPE_STR: tile[JSON_TYPE_STR], JSON_VARIANT_STR: tile[JSON_VARIANT_STR],
+                                 JSON_POS_STR: [loc[0], loc[1]]}
+            self.index_tile(loc, self.tilemap[loc])
         self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+        self.offgrid_tiles = SpatialGrid(OFFGRID_BUCKET_SIZE)
+        self.offgrid_index = {}
+        for tile in map_data['offgrid']:
+            self.add_offgrid({JSON_TYPE_STR: tile[JSON_TYPE_STR], JSON_VARIANT_STR: tile[JSON_VARIANT_STR],
+                              JSON_POS_STR: list(tile[JSON_POS_STR])})
         self.map_dims = map_data['map_dims']
         self.lvl = map_data['lvl']
+        self.build_solid_grid()
+        self.chunks = {}
+
+    def build_solid_grid(self):
+        locs = list(self.tilemap)
+        if self.map_dims:
+            locs.append((0, 0))
+            locs.append((self.map_dims[JSON_MAP_WIDTH_STR] // self.tile_size,
+                         self.map_dims[JSON_MAP_HEIGHT_STR] // self.tile_size))
+        if locs:
+            min_x = min(loc[0] for loc in locs)
+            min_y = min(loc[1] for loc in locs)
+            max_x = max(loc[0] for loc in locs)
+            max_y = max(loc[1] for loc in locs)
+        else:
+            min_x = min_y = 0
+            max_x = max_y = -1
+        self.grid_origin = (min_x, min_y)
+        self.solid_grid = np.zeros((max_x - min_x + 1, max_y - min_y + 1), dtype=bool)
+        self.solid_rects = {}
+        for loc in self.tilemap:
+            self.update_solid(loc)
+
+    def grow_solid_grid(self, loc):
+        # Re-allocate the grid so that it covers loc, keeping the cells already set
+        old_grid = self.solid_grid
+        old_origin = self.grid_origin
+        min_x = min(old_origin[0], loc[0] - SOLID_GRID_PADDING)
+        min_y = min(old_origin[1], loc[1] - SOLID_GRID_PADDING)
+        max_x = max(old_origin[0] + old_grid.shape[0], loc[0] + SOLID_GRID_PADDING + 1)
+        max_y = max(old_origin[1] + old_grid.shape[1], loc[1] + SOLID_GRID_PADDING + 1)
+        self.grid_origin = (min_x, min_y)
+        self.solid_grid = np.zeros((max_x - min_x, max_y - min_y), dtype=bool)
+        self.solid_grid[old_origin[0] - min_x:old_origin[0] - min_x + old_grid.shape[0],
+                        old_origin[1] - min_y:old_origin[1] - min_y + old_grid.shape[1]] = old_grid
+
+    def set_solid_cell(self, loc, solid):
+        gx = loc[0] - self.grid_origin[0]
+        gy = loc[1] - self.grid_origin[1]
+        if not (0 <= gx < self.solid_grid.shape[0] and 0 <= gy < self.solid_grid.shape[1]):
+            if not solid:
+                return
+            self.grow_solid_grid(loc)
+            gx = loc[0] - self.grid_origin[0]
+            gy = loc[1] - self.grid_origin[1]
+        self.solid_grid[gx, gy] = solid
+
+    def update_solid(self, loc):
+        tile = self.tilemap.get(loc)
+        solid = tile is not None and tile[JSON_TYPE_STR] in PHYSICS_TILES
+        if solid != (loc in self.solid_rects):
+            self.version += 1
+        self.set_solid_cell(loc, solid)
+        if solid:
+            self.solid_rects[loc] = pygame.Rect(loc[0] * self.tile_size, loc[1] * self.tile_size,
+                                                self.tile_size, self.tile_size)
+        else:
+            self.solid_rects.pop(loc, None)
+
+    def set_tile(self, pos, t_type, variant, autotile=False):
+        # For autotiled types the variant is only a starting point, so an existing tile
+        # of the same type is left alone instead of fighting the autotiler every frame
+        loc = (int(pos[0]), int(pos[1]))
+        tile = self.tilemap.get(loc)
+        if tile is not None and tile[JSON_TYPE_STR] == t_type:
+            if (autotile and t_type in AUTOTILE_TYPES) or tile[JSON_VARIANT_STR] == variant:
+                return tile
+        if tile is not None:
+            self.unindex_tile(loc, tile)
+        self.tilemap[loc] = {JSON_TYPE_STR: t_type, JSON_VARIANT_STR: variant,
+                             JSON_POS_STR: [loc[0], loc[1]]}
+        self.index_tile(loc, self.tilemap[loc])
+        self.update_solid(loc)
+        self.invalidate_chunk(loc)
+        if autotile:
+            self.autotile_around(loc)
+        return self.tilemap[loc]
+
+    def remove_tile(self, pos, autotile=False):
+        loc = (int(pos[0]), int(pos[1]))
+        tile = self.tilemap.pop(loc, None)
+        if tile is not None:
+            self.unindex_tile(loc, tile)
+            self.update_solid(loc)
+            self.invalidate_chunk(loc)
+            if autotile:
+                self.autotile_around(loc)
+        return tile
+
+    def add_offgrid(self, tile):
+        self.offgrid_tiles.insert(tile, self.offgrid_rect(tile))
+        self.offgrid_index.setdefault((tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]), {})[id(tile)] = tile
+        self.invalidate_offgrid(tile)
+
+    def remove_offgrid(self, tile):
+        self.invalidate_offgrid(tile)
+        self.offgrid_tiles.remove(tile)
+        id_pair = (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR])
+        del self.offgrid_index[id_pair][id(tile)]
+        if not self.offgrid_index[id_pair]:
+            del self.offgrid_index[id_pair]
+
+    def offgrid_at(self, pos):
+        return self.offgrid_tiles.query_point(pos)
+
+    def offgrid_rect(self, tile):
+        img = self.game.assets[tile[JSON_TYPE_STR]][tile[JSON_VARIANT_STR]]
+        return pygame.Rect(tile[JSON_POS_STR][0], tile[JSON_POS_STR][1],
+                           img.get_width(), img.get_height())
+
+    def invalidate_chunk(self, loc):
+        self.chunks.pop((loc[0] // CHUNK_SIZE, loc[1] // CHUNK_SIZE), None)
+
+    def invalidate_offgrid(self, tile):
+        # Offgrid decor can straddle chunk borders, so drop every chunk it touches
+        rect = self.offgrid_tiles.rect(tile)
+        chunk_px = CHUNK_SIZE * self.tile_size
+        for cx in range(rect.left // chunk_px, (rect.right - 1) // chunk_px + 1):
+            for cy in range(rect.top // chunk_px, (rect.bottom - 1) // chunk_px + 1):
+                self.chunks.pop((cx, cy), None)
+
+    def solid_cell(self, loc):
+        return loc in self.solid_rects
 
     def solid_check(self, pos):
-        tile_loc = str(int(pos[0] // TILE_SIZE)) + \
-            ';' + str(int(pos[1] // TILE_SIZE))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc][JSON_TYPE_STR] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        loc = (int(pos[0] // TILE_SIZE), int(pos[1] // TILE_SIZE))
+        if loc in self.solid_rects:
+            return self.tilemap[loc]
+
+    def solid_cells(self, boxes):
+        # Solid cells overlapping each of the N (x, y, w, h) pixel boxes, returned as
+        # parallel (box index, cell x, cell y) arrays. Overlap follows Rect.colliderect,
+        # so boxes are truncated to integers and touching edges do not count.
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        empty = np.zeros(0, dtype=int)
+        if not len(boxes):
+            return empty, empty, empty
+        left = np.trunc(boxes[:, 0]).astype(int)
+        top = np.trunc(boxes[:, 1]).astype(int)
+        width = np.maximum(np.trunc(boxes[:, 2]).astype(int), 1)
+        height = np.maximum(np.trunc(boxes[:, 3]).astype(int), 1)
+        x0 = left // self.tile_size
+        y0 = top // self.tile_size
+        span_x = (left + width - 1) // self.tile_size - x0 + 1
+        span_y = (top + height - 1) // self.tile_size - y0 + 1
+        solid_grid, grid_origin = self.solid_region(int(x0.min()), int(y0.min()),
+                                                    int((x0 + span_x).max()), int((y0 + span_y).max()))
+        if not solid_grid.size:
+            return empty, empty, empty
+
+        # Gather a fixed window per box (sized by the widest box) and mask the excess
+        dx = np.arange(span_x.max())[None, :, None]
+        dy = np.arange(span_y.max())[None, None, :]
+        cell_x, cell_y = np.broadcast_arrays(x0[:, None, None] + dx, y0[:, None, None] + dy)
+        gx = cell_x - grid_origin[0]
+        gy = cell_y - grid_origin[1]
+        mask = (dx < span_x[:, None, None]) & (dy < span_y[:, None, None])
+        mask &= (gx >= 0) & (gx < solid_grid.shape[0])
+        mask &= (gy >= 0) & (gy < solid_grid.shape[1])
+        hits = np.zeros(mask.shape, dtype=bool)
+        hits[mask] = solid_grid[gx[mask], gy[mask]]
+        index, ix, iy = np.nonzero(hits)
+        return index, cell_x[index, ix, iy], cell_y[index, ix, iy]
+
+    def solid_region(self, min_x, min_y, max_x, max_y):
+        # Solid cells covering [min, max) as (bool grid, grid origin); the full grid
+        # is always loaded here, StreamingTilemap assembles just the asked-for window
+        return self.solid_grid, self.grid_origin
+
+    def solid_overlaps(self, boxes):
+        # One flag per (x, y, w, h) box: does it overlap any solid cell?
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        overlaps = np.zeros(len(boxes), dtype=bool)
+        overlaps[self.solid_cells(boxes)[0]] = True
+        return overlaps
             
     def collide_nxt_lvl(self, player_rect):
         for nextlvl in self.lvl['next_lvl']:
@@ -103,49 +319,85 @@ class Tilemap:
         tile_loc = (int(pos[0] // self.tile_size),
                     int(pos[1] // self.tile_size))
         for offset in NEIGHBOR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + \
-                ';' + str(tile_loc[1] + offset[1])
+            check_loc = (tile_loc[0] + offset[0], tile_loc[1] + offset[1])
             if check_loc in self.tilemap:
                 tiles.append(self.tilemap[check_loc])
         return tiles
 
     def nearby_tiles_rects(self, pos):
+        # The rects come from the per-cell cache and are shared, so callers must not move them
         rects = []
-        for tile in self.nearby_tiles(pos):
-            if tile[JSON_TYPE_STR] in PHYSICS_TILES:
-                rects.append(
-                    pygame.Rect(tile[JSON_POS_STR][0] * self.tile_size,
-                                tile[JSON_POS_STR][1] * self.tile_size,
-                                self.tile_size,
-                                self.tile_size))
+        tile_loc = (int(pos[0] // self.tile_size),
+                    int(pos[1] // self.tile_size))
+        for offset in NEIGHBOR_OFFSETS:
+            rect = self.solid_rects.get((tile_loc[0] + offset[0], tile_loc[1] + offset[1]))
+            if rect is not None:
+                rects.append(rect)
         return rects
 
+    def autotile_tile(self, loc):
+        tile = self.tilemap.get(loc)
+        if tile is None or tile[JSON_TYPE_STR] not in AUTOTILE_TYPES:
+            return
+        neighbors = []
+        for shift in AUTOTILE_SHIFTS:
+            check_loc = (loc[0] + shift[0], loc[1] + shift[1])
+            if check_loc in self.tilemap:
+                if self.tilemap[check_loc][JSON_TYPE_STR] == tile[JSON_TYPE_STR]:
+                    neighbors.append(shift)
+        variant = AUTOTILE_MAP.get(tuple(neighbors))
+        if variant is not None and variant != tile[JSON_VARIANT_STR]:
+            self.unindex_tile(loc, tile)
+            tile[JSON_VARIANT_STR] = variant
+            self.index_tile(loc, tile)
+            self.invalidate_chunk(loc)
+
+    def autotile_around(self, pos):
+        # An edit can only change the variants of the cell itself and its 4 neighbours
+        loc = (int(pos[0]), int(pos[1]))
+        self.autotile_tile(loc)
+        for shift in AUTOTILE_SHIFTS:
+            self.autotile_tile((loc[0] + shift[0], loc[1] + shift[1]))
+
     def autotile(self):
         for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile[JSON_POS_STR][0] + shift[0]) + \
-                    ';' + str(tile[JSON_POS_STR][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc][JSON_TYPE_STR] == tile[JSON_TYPE_STR]:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile[JSON_TYPE_STR] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile[JSON_VARIANT_STR] = AUTOTILE_MAP[neighbors]
+            self.autotile_tile(loc)
+
+    def bake_chunk(self, chunk):
+        # Pre-render the offgrid decor and tiles of one chunk; empty chunks bake to None
+        chunk_px = CHUNK_SIZE * self.tile_size
+        chunk_rect = pygame.Rect(chunk[0] * chunk_px, chunk[1] * chunk_px, chunk_px, chunk_px)
+        blits = []
+        for tile in self.offgrid_tiles.query_rect(chunk_rect):
+            blits.append((self.game.assets[tile[JSON_TYPE_STR]][tile[JSON_VARIANT_STR]],
+                              (int(tile[JSON_POS_STR][0]) - chunk_rect.x,
+                               int(tile[JSON_POS_STR][1]) - chunk_rect.y)))
+        for x in range(chunk[0] * CHUNK_SIZE, (chunk[0] + 1) * CHUNK_SIZE):
+            for y in range(chunk[1] * CHUNK_SIZE, (chunk[1] + 1) * CHUNK_SIZE):
+                tile = self.tilemap.get((x, y))
+                if tile is not None:
+                    blits.append((self.game.assets[tile[JSON_TYPE_STR]][tile[JSON_VARIANT_STR]],
+                                  (x * self.tile_size - chunk_rect.x,
+                                   y * self.tile_size - chunk_rect.y)))
+        if not blits:
+            return None
+        chunk_surf = pygame.Surface((chunk_px, chunk_px))
+        chunk_surf.set_colorkey((0, 0, 0))
+        chunk_surf.blits(blits, doreturn=False)
+        return chunk_surf
+
+    def stream(self, camera_rect):
+        # The whole map is in memory; see StreamingTilemap
+        pass
 
     def render(self, surf, offset=(0, 0)):
-        for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile[JSON_TYPE_STR]][tile[JSON_VARIANT_STR]],
-                      (tile[JSON_POS_STR][0] - offset[0],
-                      tile[JSON_POS_STR][1] - offset[1]))
-        for x in range(offset[0] // self.tile_size,
-                       (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size,
-                           (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile[JSON_TYPE_STR]][tile[JSON_VARIANT_STR]],
-                              (tile[JSON_POS_STR][0] * self.tile_size - offset[0],
-                               tile[JSON_POS_STR][1] * self.tile_size - offset[1]))
+        chunk_px = CHUNK_SIZE * self.tile_size
+        blits = []
+        for cx in range(offset[0] // chunk_px, (offset[0] + surf.get_width()) // chunk_px + 1):
+            for cy in range(offset[1] // chunk_px, (offset[1] + surf.get_height()) // chunk_px + 1):
+                if (cx, cy) not in self.chunks:
+                    self.chunks[(cx, cy)] = self.bake_chunk((cx, cy))
+                chunk_surf = self.chunks[(cx, cy)]
+                if chunk_surf is not None:
+                    blits.append((chunk_surf, (cx * chunk_px - offset[0], cy * chunk_px - offset[1])))
+        surf.blits(blits, doreturn=False)
@@ -0,0 +1,66 @@
+import pygame
+
+from src.spatial_grid import SpatialGrid
+from src.utils import TILE_SIZE
+
+
+class Trigger:
+    # Axis-aligned zone; on_enter(trigger, entity) and on_exit(trigger, entity) are optional
+    def __init__(self, rect, on_enter=None, on_exit=None, data=None):
+        self.rect = pygame.Rect(rect)
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.data = data
+
+
+class Triggers:
+    # Triggers are matched against the grid cells an entity covers, so an entity is
+    # only re-evaluated when that cell range changes. Tile aligned triggers such as
+    # doors therefore fire exactly when the entity's rect overlaps them.
+    def __init__(self, cell_size=TILE_SIZE):
+        self.cell_size = cell_size
+        self.grid = SpatialGrid(cell_size)
+        self.entities = {}
+
+    def __len__(self):
+        return len(self.grid)
+
+    def add(self, trigger):
+        self.grid.insert(trigger, trigger.rect)
+        return trigger
+
+    def remove(self, trigger):
+        self.grid.remove(trigger)
+        for cells, inside in self.entities.values():
+            if trigger in inside:
+                inside.remove(trigger)
+
+    def cell_range(self, rect):
+        return (rect.left // self.cell_size, rect.top // self.cell_size,
+                (rect.right - 1) // self.cell_size, (rect.bottom - 1) // self.cell_size)
+
+    def update(self, entity, rect):
+        cells = self.cell_range(rect)
+        state = self.entities.get(id(entity))
+        if state is not None and state[0] == cells:
+            return
+        inside = state[1] if state is not None else []
+        area = pygame.Rect(cells[0] * self.cell_size, cells[1] * self.cell_size,
+                           (cells[2] - cells[0] + 1) * self.cell_size,
+                           (cells[3] - cells[1] + 1) * self.cell_size)
+        now_inside = self.grid.query_rect(area)
+        self.entities[id(entity)] = (cells, now_inside)
+        for trigger in inside:
+            if trigger not in now_inside and trigger.on_exit is not None:
+                trigger.on_exit(trigger, entity)
+        for trigger in now_inside:
+            if trigger not in inside and trigger.on_enter is not None:
+                trigger.on_enter(trigger, entity)
+
+    def inside(self, entity):
+        state = self.entities.get(id(entity))
+        return list(state[1]) if state is not None else []
+
+    def forget(self, entity):
+        # Drops the entity without firing exit callbacks
+        self.entities.pop(id(entity), None)
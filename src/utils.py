@@ -1,4 +1,6 @@
 import os
+
+import numpy as np
 import pygame
 
 BASE_IMG_PATH = 'data/images/'
@@ -18,6 +20,7 @@ PLAYER_SIZE_X = 13
 PLAYER_SIZE_Y = 16
 
 MAIN_MAP = 'map.json'
+MAPS_PATH = 'data/maps/'
 
 JSON_TILEMAP_STR = 'tilemap'
 JSON_TYPE_STR = 'type'
@@ -31,6 +34,15 @@ JSON_OFFGRID_STR = 'offgrid'
 JSON_MAP_DIMS_STR = 'map_dims'
 JSON_MAP_WIDTH_STR = 'map_width'
 JSON_MAP_HEIGHT_STR = 'map_height'
+JSON_LVL_STR = 'lvl'
+
+BINARY_MAP_EXT = '.tmap'
+STREAMING_MAP_EXT = '.tchunks'
+PACK_PATH = 'data/game.pack'
+# Load images and maps from PACK_PATH instead of the loose files. build_pack.py rebuilds
+# the pack when a source changed; the game itself does not check, so keep this off
+# while editing assets.
+USE_PACK = False
 
 UP_STR = 'up'
 LEFT_STR = 'left'
@@ -57,17 +69,54 @@ THROWABLE_VELOCITY_Y = -2  # Initial vertical velocity
 
 GRENADE_TIMER = 120
 
+# Move enemies in one batched PhysicsWorld step instead of one by one
+BATCHED_PHYSICS = True
+
+# Trees drop leaves while within this many pixels of the view
+LEAF_MARGIN = 32
+# Pixels per frame of the sideways drift of falling leaves
+LEAF_SWAY = 0.3
+
 EXPLOSION_GRENADE_COLORS = [
     (255, 0, 0), (255, 165, 0), (255, 255, 0), (255, 140, 0)]
 
 
-def load_image(path):
+def grow_arrays(owner, names, count, used):
+    # Doubles the capacity of owner's parallel arrays, named in names, until count rows
+    # fit; the first used rows are kept
+    capacity = len(getattr(owner, names[0]))
+    if count <= capacity:
+        return
+    while capacity < count:
+        capacity *= 2
+    for name in names:
+        old = getattr(owner, name)
+        new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+        new[:used] = old[:used]
+        setattr(owner, name, new)
+
+
+def load_image(path, pack=None):
+    if pack is not None and BASE_IMG_PATH + path in pack:
+        return pack.load_image(BASE_IMG_PATH + path)
     image = pygame.image.load(BASE_IMG_PATH + path).convert()
     image.set_colorkey((0, 0, 0))
     return image
 
 
-def load_images(path):
+def pack_sources():
+    # Files the pack is built from
+    sources = [MAPS_PATH + name for name in os.listdir(MAPS_PATH) if name.endswith('.json')]
+    for root, dirs, files in os.walk(BASE_IMG_PATH):
+        sources.extend(os.path.join(root, file_name) for file_name in files)
+    return sources
+
+
+def load_images(path, pack=None):
+    if pack is not None:
+        images = pack.load_images(BASE_IMG_PATH + path)
+        if images:
+            return images
     images = []
     for img_name in sorted(os.listdir(BASE_IMG_PATH + path)):
         images.append(load_image(path + '/' + img_name))
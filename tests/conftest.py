@@ -0,0 +1,36 @@
+import os
+import sys
+from types import SimpleNamespace
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+# The game loads its data from paths relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+import pytest
+
+from src.utils import DISPLAY_WIDTH, DISPLAY_HEIGHT, Animation, load_images
+
+# Interactive demos that open a window and loop until it is closed, not tests
+collect_ignore = ['test_ball.py', 'test_explosions.py', 'test_floating_entity.py', 'test_main_menu2.py']
+
+
+@pytest.fixture(scope='session')
+def display():
+    pygame.init()
+    yield pygame.display.set_mode((DISPLAY_WIDTH, DISPLAY_HEIGHT))
+    pygame.quit()
+
+
+@pytest.fixture(scope='session')
+def game(display):
+    # The parts of Game that tilemaps and entities read
+    assets = {name: load_images('tiles/' + name) for name in
+              ('decor', 'grass', 'large_decor', 'stone', 'spawners', 'dungeon')}
+    for e_type in ('enemy', 'floatingEnemy', 'player'):
+        for action in ('idle', 'walk'):
+            assets[e_type + '/' + action] = Animation(load_images('entities/' + e_type + '/' + action), img_dur=10)
+    return SimpleNamespace(assets=assets, initializing=False, direction='r')
@@ -0,0 +1,65 @@
+import pygame
+
+from src.ai_scheduler import AIScheduler
+
+PLAYER = pygame.Rect(0, 0, 8, 15)
+CAMERA = pygame.Rect(-160, -120, 320, 240)
+
+
+class Enemy:
+    def __init__(self, x, y=0):
+        self.pos = [x, y]
+        self.think_frames = 1
+
+    def rect(self):
+        return pygame.Rect(self.pos[0], self.pos[1], 8, 15)
+
+
+def test_near_enemies_think_every_frame():
+    scheduler = AIScheduler()
+    enemy = Enemy(40)
+    for frame in range(5):
+        assert scheduler.plan([enemy], PLAYER, CAMERA) == [enemy]
+        assert enemy.think_frames == 1
+
+
+def test_view_enemies_think_once_per_period_on_spread_phases():
+    scheduler = AIScheduler(near=16, period=4)
+    enemies = [Enemy(100 + i) for i in range(4)]
+    thinks = {id(enemy): [] for enemy in enemies}
+    for frame in range(12):
+        assert scheduler.plan(enemies, PLAYER, CAMERA) == enemies
+        for enemy in enemies:
+            if enemy.think_frames:
+                thinks[id(enemy)].append(enemy.think_frames)
+        assert scheduler.stats()['thinks'] <= 2
+    for frames in thinks.values():
+        # Each decision after the first covers the whole period
+        assert frames[1:] == [4] * (len(frames) - 1)
+        assert len(frames) == 3
+
+
+def test_budget_defers_the_rest_without_starving_them():
+    scheduler = AIScheduler(near=16, period=2, budget=3)
+    enemies = [Enemy(100 + i) for i in range(12)]
+    last = {id(enemy): 0 for enemy in enemies}
+    for frame in range(1, 41):
+        scheduler.plan(enemies, PLAYER, CAMERA)
+        assert scheduler.stats()['thinks'] <= 3
+        for enemy in enemies:
+            if enemy.think_frames:
+                # A decision stands for exactly the frames since the previous one
+                assert enemy.think_frames == frame - last[id(enemy)]
+                last[id(enemy)] = frame
+    assert all(frame > 30 for frame in last.values())
+
+
+def test_dormant_enemies_are_skipped_and_not_caught_up():
+    scheduler = AIScheduler()
+    enemy = Enemy(1000)
+    for frame in range(10):
+        assert scheduler.plan([enemy], PLAYER, CAMERA) == []
+        assert scheduler.stats() == {'thinks': 0, 'dormant': 1}
+    enemy.pos = [40, 0]
+    assert scheduler.plan([enemy], PLAYER, CAMERA) == [enemy]
+    assert enemy.think_frames == 1
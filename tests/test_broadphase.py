@@ -0,0 +1,67 @@
+import random
+
+import pygame
+
+from src.broadphase import Broadphase
+
+
+class Actor:
+    def __init__(self, x, y, size=(8, 15)):
+        self.pos = [x, y]
+        self.size = size
+
+    def rect(self):
+        return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
+
+
+def near(rect, center, radius):
+    dx = max(rect.left - center[0], 0, center[0] - rect.right)
+    dy = max(rect.top - center[1], 0, center[1] - rect.bottom)
+    return dx * dx + dy * dy <= radius * radius
+
+
+def test_queries_match_a_scan_of_every_enemy():
+    rng = random.Random(3)
+    enemies = [Actor(rng.randrange(-200, 600), rng.randrange(-100, 300)) for i in range(80)]
+    player = Actor(200, 100)
+    broadphase = Broadphase()
+    broadphase.rebuild(player, enemies)
+    for step in range(200):
+        rect = pygame.Rect(rng.randrange(-250, 600), rng.randrange(-150, 300), rng.randrange(1, 120),
+                           rng.randrange(1, 120))
+        assert broadphase.enemies_in_rect(rect) == [enemy for enemy in enemies if enemy.rect().colliderect(rect)]
+        assert broadphase.player_in_rect(rect) == player.rect().colliderect(rect)
+        center = (rng.uniform(-200, 600), rng.uniform(-100, 300))
+        radius = rng.uniform(1, 80)
+        assert broadphase.enemies_in_radius(center, radius) == [enemy for enemy in enemies
+                                                                if near(enemy.rect(), center, radius)]
+    assert broadphase.stats() == {'actors': 81, 'queries': 600}
+
+
+def test_move_and_remove_between_rebuilds():
+    enemy = Actor(0, 0)
+    other = Actor(100, 0)
+    player = Actor(300, 0)
+    broadphase = Broadphase()
+    broadphase.rebuild(player, [enemy, other])
+    enemy.pos = [200, 0]
+    broadphase.move(enemy, enemy.rect())
+    assert broadphase.enemies_in_rect(pygame.Rect(0, 0, 16, 16)) == []
+    assert broadphase.enemies_in_rect(pygame.Rect(190, 0, 16, 16)) == [enemy]
+    broadphase.remove(other)
+    broadphase.remove(other)
+    assert broadphase.enemies_in_radius((100, 8), 20) == []
+    # Actors the grid never saw are ignored
+    broadphase.move(Actor(5, 5), pygame.Rect(5, 5, 8, 15))
+    assert broadphase.stats()['actors'] == 2
+    broadphase.rebuild(player, [])
+    assert broadphase.enemies_in_rect(pygame.Rect(190, 0, 16, 16)) == []
+    assert broadphase.stats() == {'actors': 1, 'queries': 1}
+
+
+def test_segment_rect_covers_the_segment():
+    broadphase = Broadphase()
+    for origin, delta in [((10.5, 20.2), (5.3, 0)), ((10.5, 20.2), (-7.9, -3.1)), ((0, 0), (0, 0))]:
+        rect = broadphase.segment_rect(origin, delta)
+        for t in (0, 0.5, 1):
+            assert rect.collidepoint(origin[0] + delta[0] * t, origin[1] + delta[1] * t)
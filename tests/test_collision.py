@@ -0,0 +1,103 @@
+import pytest
+
+from src.collision import sweep_box, sweep_aabb, raycast, ray_rect
+
+
+class Grid:
+    # Just the part of Tilemap the sweeps read
+    tile_size = 16
+
+    def __init__(self, *cells):
+        self.cells = set(cells)
+
+    def solid_cell(self, loc):
+        return loc in self.cells
+
+
+def test_sweep_stops_at_wall():
+    hit = sweep_aabb(Grid((2, 0)), (10, 4, 8, 8), (20, 0))
+    assert hit.cell == (2, 0)
+    assert hit.normal == (-1, 0)
+    assert hit.t == pytest.approx((32 - 18) / 20)
+
+
+def test_sweep_does_not_tunnel():
+    # Far faster than a tile per frame
+    hit = sweep_aabb(Grid((5, 0), (9, 0)), (0, 0, 8, 8), (200, 0))
+    assert hit.cell == (5, 0)
+
+
+def test_sweep_zero_velocity():
+    assert sweep_aabb(Grid((1, 0)), (8, 0, 8, 8), (0, 0)) is None
+
+
+def test_sweep_touching_counts_only_when_moving_in():
+    grid = Grid((1, 0))
+    hit = sweep_aabb(grid, (8, 0, 8, 8), (4, 0))
+    assert hit.t == 0 and hit.normal == (-1, 0)
+    assert sweep_aabb(grid, (8, 0, 8, 8), (-4, 0)) is None
+    # Sliding along a face is not a hit
+    assert sweep_aabb(Grid((0, 1)), (0, 8, 8, 8), (12, 0)) is None
+
+
+def test_sweep_contact_at_end_of_move():
+    hit = sweep_aabb(Grid((2, 0)), (16, 0, 8, 8), (8, 0))
+    assert hit.t == 1 and hit.cell == (2, 0)
+
+
+def test_sweep_starting_inside_solid_is_ignored():
+    assert sweep_aabb(Grid((0, 0)), (4, 4, 8, 8), (4, 0)) is None
+    # but the next solid cell ahead still stops it
+    assert sweep_aabb(Grid((0, 0), (1, 0)), (4, 4, 8, 8), (8, 0)).cell == (1, 0)
+
+
+def test_sweep_exact_corner_hit():
+    # The box's bottom right corner meets the cell's top left corner exactly
+    hit = sweep_box((0, 0, 8, 8), (16, 16), (16, 16, 16, 16))
+    assert hit[0] == pytest.approx(0.5)
+    assert hit[1] in ((-1, 0), (0, -1))
+    # and passing just beside the corner misses
+    assert sweep_box((0, 0, 8, 8), (4, 16), (16, 16, 16, 16)) is None
+
+
+def test_raycast_hits_first_solid_cell():
+    hit = raycast(Grid((3, 0), (5, 0)), (8, 8), (100, 0))
+    assert hit.cell == (3, 0)
+    assert hit.normal == (-1, 0)
+    assert hit.t == pytest.approx(40 / 100)
+    hit = raycast(Grid((0, 3)), (8, 8), (0, 100))
+    assert hit.cell == (0, 3) and hit.normal == (0, -1)
+
+
+def test_raycast_misses_past_segment_end():
+    assert raycast(Grid((3, 0)), (8, 8), (30, 0)) is None
+
+
+def test_raycast_zero_length():
+    assert raycast(Grid((1, 0)), (8, 8), (0, 0)) is None
+
+
+def test_raycast_starting_inside_solid():
+    hit = raycast(Grid((0, 0)), (8, 8), (100, 0))
+    assert hit.t == 0 and hit.normal == (0, 0) and hit.cell == (0, 0)
+
+
+def test_raycast_through_grid_corner():
+    # The ray crosses the corner shared by four cells; it must reach the diagonal one
+    hit = raycast(Grid((1, 1)), (8, 8), (16, 16))
+    assert hit.cell == (1, 1)
+    assert hit.t == pytest.approx(0.5)
+
+
+def test_raycast_negative_direction():
+    hit = raycast(Grid((-2, 0)), (8, 8), (-60, 0))
+    assert hit.cell == (-2, 0)
+    assert hit.normal == (1, 0)
+    assert hit.t == pytest.approx(24 / 60)
+
+
+def test_ray_rect():
+    assert ray_rect((0, 8), (100, 0), (50, 0, 10, 16)) == pytest.approx(0.5)
+    assert ray_rect((55, 8), (100, 0), (50, 0, 10, 16)) == 0
+    assert ray_rect((0, 20), (100, 0), (50, 0, 10, 16)) is None
+    assert ray_rect((0, 8), (40, 0), (50, 0, 10, 16)) is None
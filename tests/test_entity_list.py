@@ -0,0 +1,96 @@
+import pytest
+
+from src.entity_list import EntityList
+
+
+class Item:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'Item(' + repr(self.name) + ')'
+
+
+def names(entities):
+    return sorted(item.name for item in entities)
+
+
+def test_kill_while_iterating():
+    entities = EntityList(Item(i) for i in range(6))
+    visited = []
+    for item in entities:
+        visited.append(item.name)
+        if item.name % 2:
+            entities.kill(item)
+    assert visited == list(range(6))
+    assert len(entities) == 3
+    assert names(entities) == [0, 2, 4]
+    entities.compact()
+    assert len(entities.items) == 3
+    assert names(entities) == [0, 2, 4]
+
+
+def test_kill_other_item_skips_it():
+    items = [Item(i) for i in range(4)]
+    entities = EntityList(items)
+    visited = []
+    for item in entities:
+        visited.append(item.name)
+        if item.name == 0:
+            entities.kill(items[2])
+    assert visited == [0, 1, 3]
+
+
+def test_appended_items_wait_for_next_loop():
+    entities = EntityList([Item(0)])
+    visited = []
+    for item in entities:
+        visited.append(item.name)
+        entities.append(Item(item.name + 1))
+    assert visited == [0]
+    assert names(entities) == [0, 1]
+
+
+def test_compact_swaps_last_items_down():
+    items = [Item(i) for i in range(5)]
+    entities = EntityList(items)
+    entities.kill(items[0])
+    entities.kill(items[4])
+    entities.kill(items[1])
+    entities.compact()
+    assert entities.items == [items[2], items[3]]
+    assert not entities.dead
+
+
+def test_kill_twice_or_unknown_raises():
+    items = [Item(0), Item(1)]
+    entities = EntityList(items)
+    entities.kill(items[0])
+    with pytest.raises(ValueError):
+        entities.kill(items[0])
+    with pytest.raises(ValueError):
+        entities.kill(Item(2))
+
+
+def test_bool_len_and_clear():
+    entities = EntityList()
+    assert not entities
+    item = Item(0)
+    entities.extend([item, Item(1)])
+    assert entities and len(entities) == 2 and entities[0] is item
+    entities.kill(item)
+    assert len(entities) == 1
+    entities.clear()
+    assert not entities and not entities.dead
+
+
+def test_nested_iteration_keeps_the_outer_cursor():
+    items = [Item(i) for i in range(3)]
+    entities = EntityList(items)
+    for item in entities:
+        if item.name == 1:
+            for other in entities:
+                pass
+            entities.kill(item)
+    entities.compact()
+    assert names(entities) == [0, 2]
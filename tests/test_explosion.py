@@ -0,0 +1,29 @@
+import pygame
+
+from src.explosion import ExplosionSprites, EXPLOSION_MIN_RADIUS, EXPLOSION_MAX_RADIUS
+from src.utils import EXPLOSION_GRENADE_COLORS
+
+
+def drawn(radius, color, alpha):
+    surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+    pygame.draw.circle(surface, (*color, alpha), (radius, radius), radius)
+    return surface
+
+
+def test_sprites_match_drawing_every_alpha_a_particle_reaches():
+    sprites = ExplosionSprites()
+    for radius in range(EXPLOSION_MIN_RADIUS, EXPLOSION_MAX_RADIUS + 1):
+        for color in EXPLOSION_GRENADE_COLORS:
+            # Particles start opaque and lose 7 alpha per update until they die
+            for alpha in range(255, 0, -7):
+                sprite = sprites.get(radius, color, alpha)
+                assert pygame.image.tobytes(sprite, 'RGBA') == pygame.image.tobytes(drawn(radius, color, alpha), 'RGBA')
+
+
+def test_sprites_are_shared_and_alpha_is_clamped():
+    sprites = ExplosionSprites(colors=[(255, 0, 0)], step=16)
+    assert sprites.get(3, (255, 0, 0), 250) is sprites.get(3, (255, 0, 0), 255)
+    assert sprites.get(3, (255, 0, 0), 300) is sprites.get(3, (255, 0, 0), 255)
+    assert sprites.get(3, (255, 0, 0), -40) is sprites.get(3, (255, 0, 0), 0)
+    assert sprites.get(3, (255, 0, 0), 0).get_at((3, 3)).a == 0
+    assert len(sprites.sprites) == (EXPLOSION_MAX_RADIUS - EXPLOSION_MIN_RADIUS + 1) * (sprites.levels + 1)
@@ -0,0 +1,106 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import src.level_registry as level_registry
+from src.level_registry import LevelCache, LevelPrefetcher, LevelRegistry
+from src.utils import JSON_SPAWNER_STR
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    # Counts parse_level calls and makes each one slow enough for the threads to overlap
+    calls = []
+    parse_level = level_registry.parse_level
+
+    def slow_parse(game, level):
+        calls.append(level)
+        time.sleep(0.05)
+        return parse_level(game, level)
+
+    monkeypatch.setattr(level_registry, 'parse_level', slow_parse)
+    return calls
+
+
+@pytest.fixture
+def level_game(game):
+    return SimpleNamespace(assets=game.assets, pack=None)
+
+
+def test_prefetch_then_take_parses_once(level_game, parses):
+    cache = LevelCache(level_game)
+    prefetcher = LevelPrefetcher(level_game, cache)
+    prefetcher.prefetch([1])
+    # The worker has started on the level when the main thread asks for it
+    time.sleep(0.01)
+    level = prefetcher.take(1)
+    assert parses == [1]
+    assert level.tilemap.tilemap
+    assert cache.instantiate(1).tilemap.tilemap == level.tilemap.tilemap
+    assert parses == [1]
+
+
+def test_take_after_prefetch_moved_on_parses_once(level_game, parses):
+    cache = LevelCache(level_game)
+    prefetcher = LevelPrefetcher(level_game, cache)
+    prefetcher.prefetch([1])
+    time.sleep(0.01)
+    # The player turned around: level 1 is no longer pending, but its parse is running
+    prefetcher.prefetch([2])
+    prefetcher.take(1)
+    assert parses.count(1) == 1
+
+
+def test_concurrent_misses_share_one_parse(level_game, parses):
+    cache = LevelCache(level_game)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.template(2))) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert parses == [2]
+    assert all(template is results[0] for template in results)
+    assert not cache.parsing
+
+
+def test_failed_parse_is_not_cached(level_game, monkeypatch):
+    cache = LevelCache(level_game)
+
+    def broken_parse(game, level):
+        raise ValueError('bad level')
+
+    monkeypatch.setattr(level_registry, 'parse_level', broken_parse)
+    with pytest.raises(ValueError):
+        cache.template(0)
+    assert not cache.parsing and not cache.templates
+
+
+def test_queued_prefetch_is_built_by_take(level_game, parses):
+    cache = LevelCache(level_game)
+    prefetcher = LevelPrefetcher(level_game, cache)
+    prefetcher.prefetch([1, 2, 3])
+    # Level 3 waits behind 1 and 2 on the single worker; take builds it right away
+    level = prefetcher.take(3)
+    assert level.spawners is not None
+    assert parses.count(3) == 1
+    prefetcher.executor.shutdown(wait=True)
+    assert parses.count(3) == 1
+
+
+def test_templates_are_not_changed_by_instances(level_game):
+    cache = LevelCache(level_game)
+    first = cache.instantiate(0)
+    first.tilemap.remove_tile(next(iter(first.tilemap.tilemap)))
+    second = cache.instantiate(0)
+    assert len(second.tilemap.tilemap) == len(first.tilemap.tilemap) + 1
+    assert not second.tilemap.extract([(JSON_SPAWNER_STR, 1)])
+
+
+def test_registry_walks_the_doors():
+    registry = LevelRegistry()
+    assert 0 in registry
+    assert len(registry) >= 2
+    assert registry.last_level() == max(registry.neighbours)
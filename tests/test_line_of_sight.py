@@ -0,0 +1,38 @@
+from src.line_of_sight import LineOfSight
+from src.tilemap import Tilemap
+
+
+def test_cached_result_is_dropped_when_a_tile_is_placed(game):
+    tilemap = Tilemap(game)
+    for x in range(6):
+        tilemap.set_tile((x, 2), 'grass', 1)
+    los = LineOfSight()
+    source, target = (8, 8), (88, 8)
+    assert los.visible(tilemap, source, target)
+    assert los.visible(tilemap, source, target)
+    assert los.stats() == {'hits': 1, 'misses': 1, 'cached': 1}
+    version = tilemap.version
+    tilemap.set_tile((3, 0), 'stone', 1)
+    assert tilemap.version != version
+    assert not los.visible(tilemap, source, target)
+    assert los.stats()['misses'] == 2
+    tilemap.remove_tile((3, 0))
+    assert los.visible(tilemap, source, target)
+
+
+def test_decor_does_not_block_or_invalidate(game):
+    tilemap = Tilemap(game)
+    los = LineOfSight()
+    assert los.visible(tilemap, (8, 8), (88, 8))
+    tilemap.set_tile((3, 0), 'decor', 0)
+    assert los.visible(tilemap, (8, 8), (88, 8))
+    assert los.stats()['hits'] == 1
+
+
+def test_other_tilemap_is_not_served_from_the_cache(game):
+    open_map = Tilemap(game)
+    walled = Tilemap(game)
+    walled.set_tile((3, 0), 'stone', 1)
+    los = LineOfSight()
+    assert los.visible(open_map, (8, 8), (88, 8))
+    assert not los.visible(walled, (8, 8), (88, 8))
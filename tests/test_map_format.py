@@ -0,0 +1,69 @@
+import glob
+import json
+import os
+
+import pytest
+
+from src.map_format import (read_map, write_map, decode_map, decode_streaming_header, map_buffer,
+                            map_path, MapFormatError)
+from src.utils import JSON_TILEMAP_STR, JSON_OFFGRID_STR, JSON_POS_STR, BINARY_MAP_EXT, STREAMING_MAP_EXT
+
+MAP_FILES = sorted(glob.glob('data/maps/*.json'))
+
+
+def by_pos(map_data):
+    return {tuple(tile[JSON_POS_STR]): tile for tile in map_data[JSON_TILEMAP_STR].values()}
+
+
+def assert_same_map(decoded, source):
+    assert by_pos(decoded) == by_pos(source)
+    assert decoded[JSON_OFFGRID_STR] == source[JSON_OFFGRID_STR]
+    for key in source:
+        if key not in (JSON_TILEMAP_STR, JSON_OFFGRID_STR):
+            assert decoded[key] == source[key]
+
+
+@pytest.mark.parametrize('path', MAP_FILES)
+def test_binary_round_trip(tmp_path, path):
+    with open(path) as f:
+        source = json.load(f)
+    binary_path = str(tmp_path / ('map' + BINARY_MAP_EXT))
+    write_map(binary_path, source)
+    assert_same_map(read_map(binary_path), source)
+
+
+@pytest.mark.parametrize('path', MAP_FILES)
+def test_streaming_round_trip(tmp_path, path):
+    with open(path) as f:
+        source = json.load(f)
+    streaming_path = str(tmp_path / ('map' + STREAMING_MAP_EXT))
+    write_map(streaming_path, source)
+    data = map_buffer(streaming_path)
+    chunk_size, meta, index = decode_streaming_header(data)
+    tilemap = {}
+    offgrid = []
+    for offset, length in index.values():
+        chunk = decode_map(data[offset:offset + length])
+        assert not tilemap.keys() & chunk[JSON_TILEMAP_STR].keys()
+        tilemap.update(chunk[JSON_TILEMAP_STR])
+        offgrid.extend(chunk[JSON_OFFGRID_STR])
+    assert by_pos({JSON_TILEMAP_STR: tilemap}) == by_pos(source)
+    key = lambda tile: (tile['type'], tile['variant'], tuple(tile[JSON_POS_STR]))
+    assert sorted(map(key, offgrid)) == sorted(map(key, source[JSON_OFFGRID_STR]))
+
+
+def test_rejects_other_files():
+    with pytest.raises(MapFormatError):
+        decode_map(b'JSON' + bytes(64))
+
+
+def test_map_path_skips_stale_conversions(tmp_path):
+    json_path = str(tmp_path / '0.json')
+    binary_path = str(tmp_path / ('0' + BINARY_MAP_EXT))
+    write_map(json_path, read_map(MAP_FILES[0]))
+    assert map_path(json_path) == json_path
+    write_map(binary_path, read_map(json_path))
+    os.utime(json_path, (1000, 1000))
+    assert map_path(json_path) == binary_path
+    os.utime(json_path, (os.path.getmtime(binary_path) + 10,) * 2)
+    assert map_path(json_path) == json_path
@@ -0,0 +1,88 @@
+import pygame
+
+from src.navigation import Navigation, NAV_AIR, NAV_GROUND
+from src.tilemap import Tilemap
+
+CAMERA = pygame.Rect(0, 0, 320, 240)
+
+
+def cell_rect(cell):
+    return pygame.Rect(cell[0] * 16 + 4, cell[1] * 16 + 1, 8, 15)
+
+
+def cell_pos(cell):
+    return (cell[0] * 16 + 8, cell[1] * 16 + 8)
+
+
+def level(game):
+    # A floor on row 10 and a ledge on row 6 over its left end
+    tilemap = Tilemap(game)
+    for x in range(20):
+        tilemap.set_tile((x, 10), 'grass', 1)
+    for x in range(6):
+        tilemap.set_tile((x, 6), 'stone', 1)
+    return tilemap
+
+
+def test_ground_flow_walks_off_ledges_to_the_landing(game):
+    tilemap = level(game)
+    nav = Navigation()
+    nav.update(tilemap, CAMERA, cell_rect((15, 9)))
+    assert nav.landing((6, 5)) == (6, 9)
+    assert nav.landing((3, 5)) == (3, 5)
+    assert nav.landing((3, 6)) is None
+    assert nav.next_step(NAV_GROUND, cell_pos((2, 5))) == (1, 0)
+    # Off the edge of the ledge, falling straight down to the floor
+    assert nav.next_step(NAV_GROUND, cell_pos((5, 5))) == (1, 4)
+    assert nav.next_step(NAV_GROUND, cell_pos((14, 9))) == (1, 0)
+    assert nav.next_step(NAV_GROUND, cell_pos((15, 9))) == (0, 0)
+    # Cells without ground below are not on the ground graph
+    assert nav.next_step(NAV_GROUND, cell_pos((10, 3))) is None
+    assert nav.next_step(NAV_AIR, cell_pos((10, 3))) is not None
+
+
+def test_ground_cannot_climb_back_onto_the_ledge(game):
+    tilemap = level(game)
+    nav = Navigation()
+    nav.update(tilemap, CAMERA, cell_rect((2, 5)))
+    assert nav.next_step(NAV_GROUND, cell_pos((12, 9))) is None
+    assert nav.next_step(NAV_AIR, cell_pos((12, 9))) is not None
+
+
+def test_player_in_the_air_is_chased_to_the_landing(game):
+    tilemap = level(game)
+    nav = Navigation()
+    nav.update(tilemap, CAMERA, cell_rect((15, 4)))
+    assert nav.next_step(NAV_GROUND, cell_pos((15, 9))) == (0, 0)
+    assert nav.next_step(NAV_GROUND, cell_pos((12, 9))) == (1, 0)
+
+
+def test_search_stops_at_the_depth(game):
+    tilemap = level(game)
+    nav = Navigation(depth=5)
+    nav.update(tilemap, CAMERA, cell_rect((15, 9)))
+    assert nav.next_step(NAV_GROUND, cell_pos((11, 9))) == (1, 0)
+    assert nav.next_step(NAV_GROUND, cell_pos((9, 9))) is None
+    assert all(abs(cell[0] - 15) <= 5 for cell in nav.flow(NAV_GROUND))
+    cells = nav.stats()['flow_cells']
+    # The cut off search is not run again for the next far query
+    assert nav.next_step(NAV_GROUND, cell_pos((2, 9))) is None
+    assert nav.stats()['flow_cells'] == cells
+
+
+def test_rebuilds_follow_the_tiles_and_the_area(game):
+    tilemap = level(game)
+    nav = Navigation()
+    nav.update(tilemap, CAMERA, cell_rect((15, 9)))
+    assert nav.next_step(NAV_GROUND, cell_pos((12, 9))) == (1, 0)
+    # A new goal only restarts the flow field
+    nav.update(tilemap, CAMERA, cell_rect((8, 9)))
+    assert nav.stats()['rebuilds'] == 1
+    assert nav.next_step(NAV_GROUND, cell_pos((12, 9))) == (-1, 0)
+    # Scrolling within the aligned area keeps the graphs
+    nav.update(tilemap, CAMERA.move(16, 0), cell_rect((8, 9)))
+    assert nav.stats()['rebuilds'] == 1
+    tilemap.set_tile((10, 9), 'stone', 1)
+    nav.update(tilemap, CAMERA.move(16, 0), cell_rect((8, 9)))
+    assert nav.stats()['rebuilds'] == 2
+    assert nav.next_step(NAV_GROUND, cell_pos((12, 9))) is None
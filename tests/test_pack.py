@@ -0,0 +1,88 @@
+import os
+
+import pygame
+import pytest
+
+import build_pack
+from src.pack import Pack, PackWriter, PackError, is_stale
+from src.utils import BASE_IMG_PATH
+
+IMAGES = ['entities/player.png', 'projectile.png', 'tiles/grass/0.png', 'tiles/grass/1.png']
+
+
+@pytest.fixture
+def pack_path(tmp_path, display):
+    writer = PackWriter()
+    for name in IMAGES:
+        writer.add_image(BASE_IMG_PATH + name, pygame.image.load(BASE_IMG_PATH + name))
+    # Same contents under a second name are stored once
+    writer.add_image(BASE_IMG_PATH + 'copy.png', pygame.image.load(BASE_IMG_PATH + IMAGES[0]))
+    writer.add_file('data/maps/0.json', b'{"tilemap": {}}')
+    path = str(tmp_path / 'game.pack')
+    writer.write(path)
+    return path
+
+
+def test_images_match_pygame_load(pack_path, display):
+    pack = Pack(pack_path)
+    for name in IMAGES:
+        image = pack.load_image(BASE_IMG_PATH + name)
+        loaded = pygame.image.load(BASE_IMG_PATH + name).convert()
+        assert image.get_size() == loaded.get_size()
+        assert pygame.image.tobytes(image, 'RGB') == pygame.image.tobytes(loaded, 'RGB')
+        assert image.get_colorkey() == (0, 0, 0, 255)
+        # Used in place: the display's layout and no per-pixel alpha, so blits are plain copies
+        assert image.get_masks()[:3] == display.get_masks()[:3]
+        assert not image.get_flags() & pygame.SRCALPHA
+        assert image.get_flags() & pygame.PREALLOC
+        loaded.set_colorkey((0, 0, 0))
+        target = pygame.Surface((64, 64))
+        expected = pygame.Surface((64, 64))
+        target.fill((40, 90, 160))
+        expected.fill((40, 90, 160))
+        target.blit(image, (3, 5))
+        expected.blit(loaded, (3, 5))
+        assert pygame.image.tobytes(target, 'RGB') == pygame.image.tobytes(expected, 'RGB')
+
+
+def test_read_and_dedup(pack_path):
+    pack = Pack(pack_path)
+    assert bytes(pack.read('data/maps/0.json')) == b'{"tilemap": {}}'
+    assert pack.entries[BASE_IMG_PATH + 'copy.png'][2] == pack.entries[BASE_IMG_PATH + IMAGES[0]][2]
+    assert 'data/maps/1.json' not in pack
+    with pytest.raises(PackError):
+        pack.load_image('data/maps/0.json')
+
+
+def test_load_images_lists_one_directory(pack_path):
+    pack = Pack(pack_path)
+    images = pack.load_images(BASE_IMG_PATH + 'tiles/grass')
+    assert len(images) == 2
+    assert pack.load_images(BASE_IMG_PATH + 'tiles') == []
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'not.pack'
+    path.write_bytes(bytes(64))
+    with pytest.raises(PackError):
+        Pack(str(path))
+
+
+def test_is_stale(pack_path, tmp_path):
+    source = tmp_path / 'source.png'
+    source.write_bytes(b'')
+    os.utime(source, (1000, 1000))
+    assert not is_stale(pack_path, [str(source)])
+    os.utime(source, (os.path.getmtime(pack_path) + 10,) * 2)
+    assert is_stale(pack_path, [str(source)])
+
+
+def test_build_skips_an_up_to_date_pack(tmp_path, display):
+    path = str(tmp_path / 'game.pack')
+    assert build_pack.build(path) is not None
+    built = os.path.getmtime(path)
+    assert build_pack.build(path) is None
+    assert os.path.getmtime(path) == built
+    assert build_pack.build(path, force=True) is not None
+    os.utime(path, (1000, 1000))
+    assert build_pack.build(path) is not None
@@ -0,0 +1,67 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from src.entities import PhysicsEntity
+from src.physics_world import PhysicsWorld
+from src.tilemap import Tilemap
+
+BODIES = 120
+FRAMES = 150
+
+
+@pytest.fixture(scope='module')
+def tilemap(game):
+    tilemap = Tilemap(game)
+    tilemap.load('data/maps/0.json')
+    return tilemap
+
+
+def make_bodies(game, world):
+    rng = random.Random(5)
+    bodies = []
+    for i in range(BODIES):
+        body = PhysicsEntity(game, 'enemy', [rng.uniform(0, 700), rng.uniform(0, 380)], (13, 16))
+        body.world = world
+        body.velocity[0] = rng.uniform(-3, 3)
+        bodies.append(body)
+    return bodies
+
+
+def run(game, tilemap, world):
+    bodies = make_bodies(game, world)
+    rng = random.Random(7)
+    history = []
+    for frame in range(FRAMES):
+        for body in bodies:
+            body.update(game, tilemap, (rng.uniform(-1, 1), rng.uniform(-0.5, 0.5)))
+        if world is not None:
+            world.step(game, tilemap)
+        history.append([(tuple(body.pos), tuple(body.velocity), body.collisions) for body in bodies])
+    return history
+
+
+@pytest.mark.parametrize('initializing, direction', [(False, 'r'), (True, 'r'), (True, 'u')])
+def test_step_matches_per_entity_moves(game, tilemap, initializing, direction):
+    state = SimpleNamespace(assets=game.assets, initializing=initializing, direction=direction)
+    single = run(state, tilemap, None)
+    batched = run(state, tilemap, PhysicsWorld())
+    for frame, (expected, actual) in enumerate(zip(single, batched)):
+        assert actual == expected, 'bodies differ on frame ' + str(frame)
+
+
+def test_step_without_bodies(game, tilemap):
+    world = PhysicsWorld()
+    world.step(game, tilemap)
+    assert len(world) == 0
+
+
+def test_step_clears_submissions(game, tilemap):
+    world = PhysicsWorld()
+    body = PhysicsEntity(game, 'enemy', [100, 100], (13, 16))
+    body.world = world
+    body.update(game, tilemap)
+    assert len(world) == 1
+    world.step(game, tilemap)
+    assert len(world) == 0
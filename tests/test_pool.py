@@ -0,0 +1,31 @@
+from src.pool import Pool
+from src.projectile import Projectile
+from src.utils import TYPE_ENEMY_STR, TYPE_PLAYER_STR
+
+
+def test_released_items_are_reused():
+    pool = Pool(Projectile)
+    first = pool.acquire([1, 2], TYPE_PLAYER_STR, 3, None, True)
+    second = pool.acquire([4, 5], TYPE_PLAYER_STR, 3, None, True)
+    assert first is not second
+    pool.release(first)
+    assert pool.stats() == {'in_use': 1, 'free': 1, 'high_water': 2, 'created': 2}
+    third = pool.acquire([7, 8], TYPE_ENEMY_STR, 5, None, False)
+    assert third is first
+    # Reset in place, as if freshly built
+    fresh = Projectile([7, 8], TYPE_ENEMY_STR, 5, None, False)
+    assert vars(third) == vars(fresh)
+    assert pool.stats() == {'in_use': 2, 'free': 0, 'high_water': 2, 'created': 2}
+
+
+def test_steady_churn_stops_creating():
+    pool = Pool(Projectile)
+    live = []
+    for frame in range(100):
+        live.append(pool.acquire([frame, 0], TYPE_PLAYER_STR, 3, None, True))
+        if len(live) > 5:
+            pool.release(live.pop(0))
+    stats = pool.stats()
+    assert stats['created'] == 6
+    assert stats['high_water'] == 6
+    assert stats['in_use'] == 5 and stats['free'] == 1
@@ -0,0 +1,106 @@
+import random
+
+import pygame
+import pytest
+
+from src.map_format import read_map, write_map
+from src.streaming_tilemap import StreamingTilemap
+from src.tilemap import Tilemap
+from src.utils import (JSON_TILEMAP_STR, JSON_OFFGRID_STR, JSON_MAP_WIDTH_STR,
+                       JSON_MAP_HEIGHT_STR, JSON_POS_STR, JSON_SPAWNER_STR, JSON_LARGE_DECOR_STR, TILE_SIZE,
+                       BINARY_MAP_EXT, STREAMING_MAP_EXT)
+
+# Level 0 repeated over a grid, so the map spans many chunks
+REPEAT_X = 8
+REPEAT_Y = 2
+LEVEL_WIDTH = 45
+LEVEL_HEIGHT = 25
+
+
+def key(tile):
+    return tile['type'], tile['variant'], tuple(tile[JSON_POS_STR])
+
+
+@pytest.fixture(scope='module')
+def maps(tmp_path_factory):
+    source = read_map('data/maps/0.json')
+    tilemap = {}
+    offgrid = []
+    for i in range(REPEAT_X):
+        for j in range(REPEAT_Y):
+            for tile in source[JSON_TILEMAP_STR].values():
+                pos = [tile[JSON_POS_STR][0] + i * LEVEL_WIDTH, tile[JSON_POS_STR][1] + j * LEVEL_HEIGHT]
+                tilemap[str(pos[0]) + ';' + str(pos[1])] = dict(tile, pos=pos)
+            for tile in source[JSON_OFFGRID_STR]:
+                offgrid.append(dict(tile, pos=[tile[JSON_POS_STR][0] + i * LEVEL_WIDTH * TILE_SIZE,
+                                               tile[JSON_POS_STR][1] + j * LEVEL_HEIGHT * TILE_SIZE]))
+    big = dict(source, tilemap=tilemap, offgrid=offgrid,
+               map_dims={JSON_MAP_WIDTH_STR: REPEAT_X * LEVEL_WIDTH * TILE_SIZE,
+                         JSON_MAP_HEIGHT_STR: REPEAT_Y * LEVEL_HEIGHT * TILE_SIZE})
+    folder = tmp_path_factory.mktemp('maps')
+    write_map(str(folder / ('big' + BINARY_MAP_EXT)), big)
+    write_map(str(folder / ('big' + STREAMING_MAP_EXT)), big)
+    return str(folder / ('big' + BINARY_MAP_EXT)), str(folder / ('big' + STREAMING_MAP_EXT))
+
+
+def load_pair(game, maps, budget):
+    full = Tilemap(game)
+    full.load(maps[0])
+    streamed = StreamingTilemap(game, budget=budget)
+    streamed.load(maps[1])
+    return full, streamed
+
+
+def assert_same_queries(full, streamed, rng, count=40):
+    width = full.map_dims[JSON_MAP_WIDTH_STR]
+    height = full.map_dims[JSON_MAP_HEIGHT_STR]
+    for i in range(count):
+        pos = (rng.uniform(-50, width + 50), rng.uniform(-50, height + 50))
+        assert (full.solid_check(pos) is None) == (streamed.solid_check(pos) is None)
+        assert sorted(map(tuple, full.nearby_tiles_rects(pos))) == sorted(map(tuple, streamed.nearby_tiles_rects(pos)))
+        assert sorted(map(key, full.nearby_tiles(pos))) == sorted(map(key, streamed.nearby_tiles(pos)))
+
+
+def test_matches_in_memory_tilemap(game, maps):
+    full, streamed = load_pair(game, maps, budget=6)
+    assert streamed.lvl == full.lvl
+    assert streamed.map_dims == full.map_dims
+    assert sorted(map(key, streamed.extract([(JSON_SPAWNER_STR, 1)]))) == \
+        sorted(map(key, full.extract([(JSON_SPAWNER_STR, 1)])))
+    assert sorted(map(key, streamed.extract([(JSON_LARGE_DECOR_STR, 2)], keep=True))) == \
+        sorted(map(key, full.extract([(JSON_LARGE_DECOR_STR, 2)], keep=True)))
+    rng = random.Random(1)
+    width = full.map_dims[JSON_MAP_WIDTH_STR]
+    height = full.map_dims[JSON_MAP_HEIGHT_STR]
+    full_surface = pygame.Surface((160, 120))
+    streamed_surface = pygame.Surface((160, 120))
+    for step in range(30):
+        # The small budget evicts chunks all along, so most queries reload theirs
+        camera = pygame.Rect(rng.randint(0, width - 160), rng.randint(0, height - 120), 160, 120)
+        streamed.stream(camera)
+        assert len(streamed.loaded) <= max(streamed.budget, len(streamed.pinned))
+        assert_same_queries(full, streamed, rng)
+        boxes = [(rng.uniform(0, width), rng.uniform(0, height), rng.randint(1, 30), rng.randint(1, 30))
+                 for i in range(50)]
+        assert sorted(zip(*map(list, full.solid_cells(boxes)))) == sorted(zip(*map(list, streamed.solid_cells(boxes))))
+        full.render(full_surface, camera.topleft)
+        streamed.render(streamed_surface, camera.topleft)
+        assert pygame.image.tobytes(full_surface, 'RGB') == pygame.image.tobytes(streamed_surface, 'RGB')
+    # Extracted tiles stay out of chunks loaded again after being evicted
+    assert not any(tile['type'] == JSON_SPAWNER_STR and tile['variant'] == 1
+                   for tile in streamed.tilemap.values())
+
+
+def test_queries_respect_the_budget(game, maps):
+    full, streamed = load_pair(game, maps, budget=4)
+    streamed.stream(pygame.Rect(0, 0, 16, 16))
+    version = streamed.version
+    width = full.map_dims[JSON_MAP_WIDTH_STR]
+    height = full.map_dims[JSON_MAP_HEIGHT_STR]
+    # Two boxes at opposite corners load their own chunks, not everything between them
+    streamed.solid_cells([(8, 8, 4, 4), (width - 24, height - 24, 4, 4)])
+    assert len(streamed.loaded) <= max(streamed.budget, len(streamed.pinned) + 2)
+    assert_same_queries(full, streamed, random.Random(2), count=200)
+    assert len(streamed.loaded) <= max(streamed.budget, len(streamed.pinned) + 4)
+    # Loading and dropping chunks is not a change to the map
+    assert streamed.version == version
@@ -0,0 +1,136 @@
+import random
+
+import pytest
+
+from src.tilemap import Tilemap, AUTOTILE_MAP
+from src.utils import JSON_TYPE_STR, JSON_VARIANT_STR, JSON_POS_STR, TILE_SIZE
+
+
+def variants(tilemap):
+    return {loc: (tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) for loc, tile in tilemap.tilemap.items()}
+
+
+def autotiled_copy(game, tilemap):
+    # Same tiles run through the full autotile pass
+    full = Tilemap(game)
+    full.load_data(tilemap.map_data())
+    full.autotile()
+    return full
+
+
+@pytest.mark.parametrize('t_type, old, new', [('spawners', 0, 1), ('decor', 0, 2), ('large_decor', 1, 2)])
+def test_repaint_other_variant_of_plain_type(game, t_type, old, new):
+    tilemap = Tilemap(game)
+    tilemap.set_tile((3, 4), t_type, old, autotile=True)
+    tile = tilemap.set_tile((3, 4), t_type, new, autotile=True)
+    assert tile[JSON_VARIANT_STR] == new
+    assert tilemap.tilemap[(3, 4)] is tile
+    assert list(tilemap.tile_index[(t_type, new)]) == [(3, 4)]
+    assert (t_type, old) not in tilemap.tile_index
+
+
+def test_repaint_autotiled_type_keeps_its_variant(game):
+    tilemap = Tilemap(game)
+    for x in range(3):
+        tilemap.set_tile((x, 0), 'grass', 0, autotile=True)
+    for x in range(3):
+        tilemap.set_tile((x, 1), 'grass', 0, autotile=True)
+    before = variants(tilemap)
+    chunks = dict(tilemap.chunks)
+    tilemap.set_tile((1, 1), 'grass', 5, autotile=True)
+    assert variants(tilemap) == before
+    assert tilemap.chunks == chunks
+
+
+def test_set_tile_autotiles_neighbours(game):
+    tilemap = Tilemap(game)
+    tilemap.set_tile((0, 0), 'grass', 8, autotile=True)
+    tilemap.set_tile((1, 0), 'grass', 8, autotile=True)
+    tilemap.set_tile((0, 1), 'grass', 8, autotile=True)
+    # (0, 0) now has neighbours right and below
+    assert tilemap.tilemap[(0, 0)][JSON_VARIANT_STR] == AUTOTILE_MAP[((0, 1), (1, 0))]
+    # A different autotiled type is not a neighbour
+    tilemap.set_tile((0, -1), 'stone', 8, autotile=True)
+    assert tilemap.tilemap[(0, 0)][JSON_VARIANT_STR] == AUTOTILE_MAP[((0, 1), (1, 0))]
+
+
+def test_set_tile_without_autotile_replaces_variant(game):
+    tilemap = Tilemap(game)
+    tilemap.set_tile((0, 0), 'grass', 1)
+    assert tilemap.set_tile((0, 0), 'grass', 3)[JSON_VARIANT_STR] == 3
+    assert tilemap.set_tile((0, 0), 'stone', 3)[JSON_TYPE_STR] == 'stone'
+    assert list(tilemap.tile_index) == [('stone', 3)]
+    assert tilemap.solid_cell((0, 0))
+
+
+def test_remove_tile_autotiles_neighbours(game):
+    tilemap = Tilemap(game)
+    for x in range(3):
+        for y in range(3):
+            tilemap.set_tile((x, y), 'grass', 0, autotile=True)
+    removed = tilemap.remove_tile((1, 0), autotile=True)
+    assert removed[JSON_TYPE_STR] == 'grass'
+    assert (1, 0) not in tilemap.tilemap
+    assert not tilemap.solid_cell((1, 0))
+    # (1, 1) lost its neighbour above
+    assert tilemap.tilemap[(1, 1)][JSON_VARIANT_STR] == AUTOTILE_MAP[((-1, 0), (0, 1), (1, 0))]
+    assert variants(tilemap) == variants(autotiled_copy(game, tilemap))
+    assert tilemap.remove_tile((9, 9), autotile=True) is None
+
+
+def test_incremental_autotile_matches_full_pass(game):
+    rng = random.Random(4)
+    tilemap = Tilemap(game)
+    for step in range(600):
+        loc = (rng.randrange(10), rng.randrange(8))
+        if rng.random() < 0.3:
+            tilemap.remove_tile(loc, autotile=True)
+        else:
+            tilemap.set_tile(loc, rng.choice(['grass', 'stone', 'decor']), rng.randrange(4), autotile=True)
+        if step % 50 == 0:
+            assert variants(tilemap) == variants(autotiled_copy(game, tilemap))
+    assert variants(tilemap) == variants(autotiled_copy(game, tilemap))
+    for loc, tile in tilemap.tilemap.items():
+        assert tile[JSON_POS_STR] == list(loc)
+
+
+def scan(tilemap, id_pair):
+    # What extract should return, found by walking every tile
+    found = [(tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR], tile[JSON_POS_STR][0] * TILE_SIZE,
+              tile[JSON_POS_STR][1] * TILE_SIZE) for tile in tilemap.tilemap.values()]
+    found += [(tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) + tuple(tile[JSON_POS_STR])
+              for tile in tilemap.offgrid_tiles]
+    return sorted(item for item in found if item[:2] == id_pair)
+
+
+def extracted(tilemap, id_pair, keep=True):
+    return sorted((tile[JSON_TYPE_STR], tile[JSON_VARIANT_STR]) + tuple(tile[JSON_POS_STR])
+                  for tile in tilemap.extract([id_pair], keep=keep))
+
+
+def test_extract_matches_a_full_scan(game):
+    rng = random.Random(7)
+    tilemap = Tilemap(game)
+    types = ['grass', 'stone', 'decor', 'spawners']
+    pairs = [(t_type, variant) for t_type in types for variant in range(2)]
+    for step in range(400):
+        action = rng.random()
+        if action < 0.45:
+            loc = (rng.randrange(8), rng.randrange(6))
+            tilemap.set_tile(loc, rng.choice(types), rng.randrange(2), autotile=rng.random() < 0.5)
+        elif action < 0.6:
+            tilemap.remove_tile((rng.randrange(8), rng.randrange(6)), autotile=rng.random() < 0.5)
+        elif action < 0.75:
+            tilemap.add_offgrid({JSON_TYPE_STR: rng.choice(types[:3]), JSON_VARIANT_STR: rng.randrange(2),
+                                 JSON_POS_STR: [rng.randrange(128), rng.randrange(96)]})
+        elif action < 0.9:
+            id_pair = rng.choice(pairs)
+            expected = scan(tilemap, id_pair)
+            assert extracted(tilemap, id_pair, keep=False) == expected
+            assert scan(tilemap, id_pair) == []
+        else:
+            copy = Tilemap(game)
+            copy.load_data(tilemap.map_data())
+            tilemap = copy
+        for id_pair in pairs:
+            assert extracted(tilemap, id_pair) == scan(tilemap, id_pair)
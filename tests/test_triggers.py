@@ -0,0 +1,87 @@
+import pygame
+
+from src.triggers import Trigger, Triggers
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def enter(self, trigger, entity):
+        self.events.append(('enter', trigger.data, entity))
+
+    def exit(self, trigger, entity):
+        self.events.append(('exit', trigger.data, entity))
+
+
+def make_triggers(recorder, *rects):
+    triggers = Triggers(16)
+    for index, rect in enumerate(rects):
+        triggers.add(Trigger(rect, recorder.enter, recorder.exit, data=index))
+    return triggers
+
+
+def test_tile_aligned_trigger_fires_on_overlap():
+    recorder = Recorder()
+    triggers = make_triggers(recorder, (64, 0, 16, 48))
+    player = object()
+    triggers.update(player, pygame.Rect(47, 16, 13, 16))
+    assert recorder.events == []
+    # One pixel into the trigger's column
+    triggers.update(player, pygame.Rect(52, 16, 13, 16))
+    assert recorder.events == [('enter', 0, player)]
+    assert [trigger.data for trigger in triggers.inside(player)] == [0]
+    triggers.update(player, pygame.Rect(80, 16, 13, 16))
+    assert recorder.events == [('enter', 0, player), ('exit', 0, player)]
+    assert triggers.inside(player) == []
+
+
+def test_moves_within_the_same_cells_are_skipped():
+    recorder = Recorder()
+    triggers = make_triggers(recorder, (0, 0, 32, 32))
+    player = object()
+    triggers.update(player, pygame.Rect(2, 2, 8, 8))
+    triggers.update(player, pygame.Rect(4, 4, 8, 8))
+    triggers.update(player, pygame.Rect(6, 6, 8, 8))
+    assert recorder.events == [('enter', 0, player)]
+
+
+def test_several_triggers_and_entities():
+    recorder = Recorder()
+    triggers = make_triggers(recorder, (0, 0, 16, 16), (16, 0, 16, 16))
+    first = object()
+    second = object()
+    triggers.update(first, pygame.Rect(8, 0, 16, 16))
+    triggers.update(second, pygame.Rect(16, 0, 16, 16))
+    assert recorder.events == [('enter', 0, first), ('enter', 1, first), ('enter', 1, second)]
+    triggers.update(first, pygame.Rect(16, 0, 16, 16))
+    assert recorder.events[-1] == ('exit', 0, first)
+
+
+def test_remove_and_forget():
+    recorder = Recorder()
+    triggers = make_triggers(recorder, (0, 0, 16, 16))
+    player = object()
+    triggers.update(player, pygame.Rect(0, 0, 8, 8))
+    trigger = triggers.inside(player)[0]
+    triggers.remove(trigger)
+    assert len(triggers) == 0
+    assert triggers.inside(player) == []
+    # Removed triggers do not fire on the way out
+    triggers.update(player, pygame.Rect(64, 0, 8, 8))
+    assert recorder.events == [('enter', 0, player)]
+
+    triggers.add(trigger)
+    triggers.update(player, pygame.Rect(0, 0, 8, 8))
+    triggers.forget(player)
+    triggers.update(player, pygame.Rect(0, 0, 8, 8))
+    assert recorder.events == [('enter', 0, player)] * 3
+
+
+def test_callbacks_are_optional():
+    triggers = Triggers(16)
+    triggers.add(Trigger((0, 0, 16, 16)))
+    player = object()
+    triggers.update(player, pygame.Rect(0, 0, 8, 8))
+    triggers.update(player, pygame.Rect(64, 0, 8, 8))
+    assert triggers.inside(player) == []